@@ -0,0 +1,167 @@
+import asyncio
+import time
+from web3 import AsyncWeb3, Web3
+from web3.providers import AsyncHTTPProvider
+from rpc import RPC
+from scannerRpcInterface import IfixedScan, IJobManager
+
+
+def getAsyncW3(w3):
+    # only http endpoints have an async provider that can pipeline requests
+    if isinstance(w3.provider, Web3.HTTPProvider):
+        provider = AsyncHTTPProvider(w3.provider.endpoint_uri)
+        provider.middlewares.clear()
+        return AsyncWeb3(provider)
+    return None
+
+
+# what one concurrent slot keeps to itself. it is swapped into the rpc around
+# the synchronous parts of the slot's turn, so one slot's errors don't shrink
+# or fail the others
+class Slot:
+    def __init__(self, chunkSize):
+        self.jobs = []
+        self.chunkSize = chunkSize
+        self.failCount = 0
+        self.pause = 0
+
+
+class AsyncRPC(RPC):
+    def __init__(
+        self,
+        rpcSettings,
+        scanMode,
+        contracts,
+        abiLookups,
+        scheduler=None,
+        endpoint=-1,
+        limiter=None,
+        backupLimiters=None,
+    ):
+        super().__init__(
+            rpcSettings,
+            scanMode,
+            contracts,
+            abiLookups,
+            scheduler,
+            endpoint,
+            limiter,
+            backupLimiters,
+        )
+        self.concurrency = rpcSettings.get("CONCURRENCY", 1)
+        self.aw3 = getAsyncW3(self.w3)
+        self.slot = None
+        if self.aw3 is None:
+            self.logWarn(
+                f"async scanning only supported over http, {self.apiUrl} running synchronously",
+                True,
+                False,
+            )
+        else:
+            # concurrent slots request logs straight through the async provider
+            skipped = [
+                name
+                for name, enabled in (
+                    ("CACHE", self.cache is not None),
+                    ("RAWTRANSPORT", rpcSettings.get("RAWTRANSPORT", False)),
+                    ("BLOOMFILTER", self.bloomFilter),
+                    ("BATCHSIZE", self.batchSize > 1),
+                )
+                if enabled
+            ]
+            if skipped:
+                self.logWarn(
+                    f"{', '.join(skipped)} not used by concurrent fixed scans of {self.apiUrl}, set CONCURRENCY to 1 to use them",
+                    True,
+                    False,
+                )
+        self.logInfo(f"async rpc running {self.concurrency} concurrent requests")
+
+    def runFixed(self):
+        if self.aw3 is None:
+            return super().runFixed()
+        asyncio.run(self.asyncFixedScan())
+
+    async def asyncFixedScan(self):
+        slots = [Slot(self.currentChunkSize) for i in range(self.concurrency)]
+        await asyncio.gather(self.watchJobs(), *[self.scanSlot(slot) for slot in slots])
+        for slot in slots:
+            for job in slot.jobs:
+                IfixedScan.addScanRange(job[0], job[1])
+
+    # requests from the coordinator are served off the event loop
+    async def watchJobs(self):
+        while IJobManager.state == 1 and self.running:
+            await asyncio.to_thread(IJobManager.checkJob, self)
+            await asyncio.sleep(self.pollInterval)
+
+    def enter(self, slot):
+        self.slot = slot
+        self.currentChunkSize = slot.chunkSize
+        self.failCount = slot.failCount
+
+    def leave(self, slot):
+        slot.chunkSize = self.currentChunkSize
+        slot.failCount = self.failCount
+        self.slot = None
+
+    # error handling asks for pauses, a slot waits them out without blocking
+    # the others
+    def pause(self, seconds):
+        if self.slot is None:
+            return super().pause(seconds)
+        self.slot.pause = max(self.slot.pause, seconds)
+
+    def takeJob(self, slot):
+        if len(slot.jobs) == 0:
+            newJob = self.requestJob()
+            if newJob == [] or newJob[0] == newJob[1]:
+                return None
+            slot.jobs.append(newJob)
+            self.logInfo(f"job added: {slot.jobs} ")
+        job = self.nextJob(slot.jobs)
+        self.logInfo(f"starting job {job}")
+        return job
+
+    async def scanSlot(self, slot):
+        while IJobManager.state == 1 and self.running:
+            benched = self.benchedFor()
+            if benched:
+                await asyncio.sleep(min(benched, self.pollInterval))
+                continue
+            self.enter(slot)
+            try:
+                job = self.takeJob(slot)
+            finally:
+                self.leave(slot)
+            if job is None:
+                await asyncio.sleep(self.pollInterval)
+                continue
+            try:
+                startTime = time.time()
+                events = await self.scanChunkAsync(job[0], job[1])
+                latency = time.time() - startTime
+                self.enter(slot)
+                IfixedScan.addResults([job[0], self.decodeEvents(events), job[1]])
+                self.throttle(events, job[0], job[1] - job[0], latency)
+                self.logInfo(
+                    f"processed events: {len(events)}, from {job[0]} to {job[1]} ({job[1]-job[0]}), throttled to {self.currentChunkSize}"
+                )
+                slot.jobs.pop(0)
+                self.failCount = 0
+            except Exception as e:
+                self.enter(slot)
+                self.handleError(e, slot.jobs)
+            finally:
+                self.leave(slot)
+            if slot.pause:
+                await asyncio.sleep(slot.pause)
+                slot.pause = 0
+
+    async def scanChunkAsync(self, start, end):
+        filterParams = self.getFilter(start, end)
+        if self.limiter is not None:
+            await self.limiter.acquireAsync("eth_getLogs")
+        eventlogs = await self.aw3.eth.get_logs(filterParams)
+        self.logInfo(f"received events: {len(eventlogs)}")
+        return eventlogs
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import shutil
+import orjson
+
+# sweep the cache for eviction after this fraction of its size was written
+SWEEPFRACTION = 0.05
+
+
+def toBlock(value):
+    return int(value, 16) if isinstance(value, str) else value
+
+
+# the fewest of the stored [lo, hi] pieces that together cover [start, end],
+# None if there is a gap
+def coverRange(pieces, start, end):
+    chosen = []
+    block = start
+    while block <= end:
+        reaching = [piece for piece in pieces if piece[0] <= block <= piece[1]]
+        if not reaching:
+            return None
+        piece = max(reaching, key=lambda piece: piece[1])
+        chosen.append(piece)
+        block = piece[1] + 1
+    return chosen
+
+
+# overlapping pieces return the same log more than once
+def uniqueLogs(logs):
+    unique = {(log["blockNumber"], log["logIndex"]): log for log in logs}
+    return sorted(
+        unique.values(),
+        key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)),
+    )
+
+
+# raw eth_getLogs responses on disk, split per address (or per topic0 when
+# the filter has no addresses) and per bucket of blocks so scans with other
+# contract sets, event lists or chunk sizes can reuse them. responses covering
+# only part of a bucket are kept as pieces until they add up to the whole
+# bucket. only blocks below the finality depth are stored, the least recently
+# used files are evicted once the cache grows past maxBytes
+class ChunkCache:
+    def __init__(self, path, bucketSize=1000, finalityDepth=1000, maxBytes=1 << 30):
+        self.path = path
+        self.bucketSize = bucketSize
+        self.finalityDepth = finalityDepth
+        self.maxBytes = maxBytes
+        self.head = None
+        self.written = 0
+        os.makedirs(path, exist_ok=True)
+
+    # one (directory, key of the log) pair per address or topic0 the filter
+    # asks for, every key has to be cached for a range to be served locally
+    def splitFilter(self, filterParams):
+        addresses = filterParams.get("address") or []
+        topics = filterParams.get("topics") or []
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        if addresses:
+            # other topic filters on the same address are cached separately
+            topicKey = hashlib.sha1(orjson.dumps(topics)).hexdigest()[:16]
+            return [
+                (f"a/{address.lower()}/{topicKey}", address.lower())
+                for address in addresses
+            ]
+        topic0s = topics[0] if topics else None
+        if not topic0s or len(topics) > 1:
+            return None
+        if isinstance(topic0s, str):
+            topic0s = [topic0s]
+        return [(f"t/{topic0.lower()}", topic0.lower()) for topic0 in topic0s]
+
+    def logKey(self, filterParams, log):
+        if filterParams.get("address"):
+            return log["address"].lower()
+        return log["topics"][0].lower()
+
+    def buckets(self, start, end):
+        return range(start // self.bucketSize, end // self.bucketSize + 1)
+
+    def bucketRange(self, bucket):
+        return bucket * self.bucketSize, (bucket + 1) * self.bucketSize - 1
+
+    def isFinal(self, block):
+        return self.head is not None and block < self.head - self.finalityDepth
+
+    def fileName(self, directory, bucket):
+        return f"{self.path}{directory}/{bucket}.json"
+
+    def partsDir(self, directory, bucket):
+        return f"{self.path}{directory}/{bucket}.parts/"
+
+    def listParts(self, partsDir):
+        try:
+            names = os.listdir(partsDir)
+        except FileNotFoundError:
+            return []
+        parts = []
+        for name in names:
+            fields = name.split(".")
+            # skips files still being written
+            if len(fields) == 3 and fields[2] == "json":
+                parts.append((int(fields[0]), int(fields[1])))
+        return parts
+
+    def read(self, fileName):
+        try:
+            with open(fileName, "rb") as f:
+                logs = orjson.loads(f.read())
+            os.utime(fileName)
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return None
+        return logs
+
+    # logs of [lo, hi] within one bucket, from the whole bucket's file or from
+    # stored pieces covering the range
+    def readPiece(self, directory, bucket, lo, hi):
+        logs = self.read(self.fileName(directory, bucket))
+        if logs is not None:
+            return logs
+        partsDir = self.partsDir(directory, bucket)
+        pieces = coverRange(self.listParts(partsDir), lo, hi)
+        if pieces is None:
+            return None
+        logs = []
+        for pieceLo, pieceHi in pieces:
+            pieceLogs = self.read(f"{partsDir}{pieceLo}.{pieceHi}.json")
+            if pieceLogs is None:
+                return None
+            logs.extend(pieceLogs)
+        return logs
+
+    # the raw logs of the range or None if any part of it isn't cached
+    def lookup(self, filterParams):
+        keys = self.splitFilter(filterParams)
+        if keys is None:
+            return None
+        start = toBlock(filterParams["fromBlock"])
+        end = toBlock(filterParams["toBlock"])
+        logs = []
+        for bucket in self.buckets(start, end):
+            bucketStart, bucketEnd = self.bucketRange(bucket)
+            lo, hi = max(start, bucketStart), min(end, bucketEnd)
+            for directory, key in keys:
+                bucketLogs = self.readPiece(directory, bucket, lo, hi)
+                if bucketLogs is None:
+                    return None
+                logs.extend(
+                    log
+                    for log in bucketLogs
+                    if start <= int(log["blockNumber"], 16) <= end
+                )
+        return uniqueLogs(logs)
+
+    # stores the part of every bucket the response covers, the whole bucket
+    # directly and anything less as a piece
+    def store(self, filterParams, logs):
+        keys = self.splitFilter(filterParams)
+        if keys is None:
+            return
+        start = toBlock(filterParams["fromBlock"])
+        end = toBlock(filterParams["toBlock"])
+        byBucket = {}
+        for log in logs:
+            bucket = int(log["blockNumber"], 16) // self.bucketSize
+            key = self.logKey(filterParams, log)
+            byBucket.setdefault((bucket, key), []).append(log)
+        for bucket in self.buckets(start, end):
+            bucketStart, bucketEnd = self.bucketRange(bucket)
+            lo, hi = max(start, bucketStart), min(end, bucketEnd)
+            if not self.isFinal(hi):
+                continue
+            for directory, key in keys:
+                bucketLogs = byBucket.get((bucket, key), [])
+                if lo == bucketStart and hi == bucketEnd:
+                    self.write(self.fileName(directory, bucket), bucketLogs)
+                else:
+                    self.storePiece(directory, bucket, lo, hi, bucketLogs)
+
+    # pieces are merged into the bucket's file once they cover all of it
+    def storePiece(self, directory, bucket, lo, hi, logs):
+        if os.path.exists(self.fileName(directory, bucket)):
+            return
+        partsDir = self.partsDir(directory, bucket)
+        self.write(f"{partsDir}{lo}.{hi}.json", logs)
+        bucketLogs = self.readPiece(directory, bucket, *self.bucketRange(bucket))
+        if bucketLogs is None:
+            return
+        self.write(self.fileName(directory, bucket), uniqueLogs(bucketLogs))
+        shutil.rmtree(partsDir, ignore_errors=True)
+
+    def write(self, fileName, logs):
+        os.makedirs(os.path.dirname(fileName), exist_ok=True)
+        data = orjson.dumps(logs)
+        tmpName = f"{fileName}.{os.getpid()}.tmp"
+        with open(tmpName, "wb") as f:
+            f.write(data)
+        os.replace(tmpName, fileName)
+        self.written += len(data)
+        if self.written > self.maxBytes * SWEEPFRACTION:
+            self.evict()
+
+    # several processes share the directory, so the size is measured on disk
+    # rather than tracked in memory
+    def evict(self):
+        self.written = 0
+        files = []
+        total = 0
+        for root, dirs, names in os.walk(self.path):
+            for name in names:
+                fileName = os.path.join(root, name)
+                try:
+                    stat = os.stat(fileName)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, fileName))
+                total += stat.st_size
+        if total <= self.maxBytes:
+            return
+        files.sort()
+        target = self.maxBytes * 0.9
+        for mtime, size, fileName in files:
+            if total <= target:
+                break
+            try:
+                os.remove(fileName)
+            except FileNotFoundError:
+                pass
+            total -= size
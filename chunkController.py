@@ -0,0 +1,155 @@
+import json
+import os
+
+# weight of the newest sample in the moving averages
+ALPHA = 0.3
+SAVEEVERY = 20
+
+
+# picks the getLogs chunk size for one endpoint: event density learned per
+# block region sets the target, the provider's range limit is a hard ceiling
+# and slow, oversized or failed responses cut a soft ceiling that grows back
+# additively on fast responses (AIMD)
+class ChunkController:
+    def __init__(self, rpcSettings, path):
+        self.maxChunkSize = rpcSettings["MAXCHUNKSIZE"]
+        self.eventsTarget = rpcSettings["EVENTSTARGET"]
+        self.targetLatency = rpcSettings.get("TARGETLATENCY", 5) or 5
+        self.maxResponseBytes = rpcSettings.get("MAXRESPONSEBYTES", 0) or 0
+        self.regionSize = rpcSettings.get("DENSITYREGION", 100000) or 100000
+        self.path = path
+        self.size = rpcSettings["STARTCHUNKSIZE"]
+        self.rangeLimit = self.maxChunkSize
+        self.ceiling = self.maxChunkSize
+        self.density = {}
+        self.bytesPerEvent = None
+        self.updates = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            state = json.load(f)
+        self.rangeLimit = min(state["rangeLimit"], self.maxChunkSize)
+        self.ceiling = min(state["ceiling"], self.rangeLimit)
+        self.density = {int(region): d for region, d in state["density"].items()}
+        self.bytesPerEvent = state["bytesPerEvent"]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "rangeLimit": self.rangeLimit,
+                    "ceiling": self.ceiling,
+                    "density": self.density,
+                    "bytesPerEvent": self.bytesPerEvent,
+                },
+                f,
+            )
+        os.replace(self.path + ".tmp", self.path)
+
+    def clamp(self, size):
+        return int(max(1, min(size, self.ceiling, self.rangeLimit, self.maxChunkSize)))
+
+    def sizeFor(self, block):
+        density = self.density.get(block // self.regionSize)
+        if density is None:
+            return self.clamp(self.size)
+        if density == 0:
+            return self.clamp(self.maxChunkSize)
+        target = self.eventsTarget / density
+        if self.maxResponseBytes and self.bytesPerEvent:
+            target = min(target, self.maxResponseBytes / (self.bytesPerEvent * density))
+        return self.clamp(target)
+
+    def onSuccess(self, start, blocks, numEvents, latency=None, numBytes=None):
+        blocks = max(blocks, 1)
+        region = start // self.regionSize
+        sample = numEvents / blocks
+        previous = self.density.get(region)
+        self.density[region] = (
+            sample if previous is None else previous + ALPHA * (sample - previous)
+        )
+        if numBytes and numEvents:
+            sample = numBytes / numEvents
+            previous = self.bytesPerEvent
+            self.bytesPerEvent = (
+                sample if previous is None else previous + ALPHA * (sample - previous)
+            )
+        if latency is not None and latency > self.targetLatency:
+            self.ceiling = self.clamp(blocks * max(0.5, self.targetLatency / latency))
+        elif blocks >= self.ceiling:
+            self.ceiling = min(
+                self.ceiling + max(1, self.ceiling // 20), self.rangeLimit
+            )
+        self.size = self.sizeFor(start + blocks)
+        self.updates += 1
+        if self.updates % SAVEEVERY == 0:
+            self.save()
+        return self.size
+
+    # the provider refused the range outright, never ask for more again
+    def limitRange(self, blocks):
+        self.rangeLimit = max(1, int(blocks * 0.98))
+        self.ceiling = min(self.ceiling, self.rangeLimit)
+        self.size = self.clamp(self.size)
+        self.save()
+        return self.size
+
+    # timeouts and oversized responses cut the soft ceiling
+    def backOff(self, blocks, factor=0.5):
+        self.ceiling = max(1, int(min(blocks, self.ceiling) * factor))
+        self.size = self.clamp(self.size)
+        return self.size
+
+
+# averages the densities every endpoint has learned, region -> events per block
+def loadDensity(directory):
+    samples = {}
+    if os.path.isdir(directory):
+        for file in os.listdir(directory):
+            if not file.endswith(".json"):
+                continue
+            with open(directory + file) as f:
+                for region, density in json.load(f)["density"].items():
+                    samples.setdefault(int(region), []).append(density)
+    return {region: sum(d) / len(d) for region, d in samples.items()}
+
+
+# splits [start, end) into (start, end, jobSize) ranges so each job is expected
+# to return about eventsTarget events, regions without data borrow the density
+# of the nearest known region
+def planJobs(start, end, density, regionSize, eventsTarget, maxChunkSize):
+    if not density:
+        return [(start, end, 0)]
+    known = sorted(density)
+    plan = []
+    block = start
+    while block < end:
+        region = block // regionSize
+        nearest = min(known, key=lambda r: abs(r - region))
+        d = density[nearest]
+        jobSize = maxChunkSize if d == 0 else eventsTarget / d
+        jobSize = int(max(1, min(jobSize, maxChunkSize)))
+        rangeEnd = min((region + 1) * regionSize, end)
+        if plan and plan[-1][2] == jobSize and plan[-1][1] == block:
+            plan[-1] = (plan[-1][0], rangeEnd, jobSize)
+        else:
+            plan.append((block, rangeEnd, jobSize))
+        block = rangeEnd
+    return plan
+
+
+# drops the blocks of already scanned [start, end) ranges from a plan
+def excludeRanges(plan, ranges):
+    for rangeStart, rangeEnd in sorted(ranges):
+        kept = []
+        for start, end, jobSize in plan:
+            if start < rangeStart:
+                kept.append((start, min(end, rangeStart), jobSize))
+            if end > rangeEnd:
+                kept.append((max(start, rangeEnd), end, jobSize))
+        plan = kept
+    return plan
@@ -0,0 +1,180 @@
+import json
+from functools import lru_cache
+import numpy as np
+from eth_utils import to_checksum_address
+from fileHandler import FileHandler
+
+INT64_MIN = -(2**63)
+INT64_MAX = 2**63 - 1
+
+
+@lru_cache(maxsize=65536)
+def checksum(raw):
+    return to_checksum_address(raw)
+
+
+def fromHex(value, size):
+    if value.startswith("0x"):
+        value = value[2:]
+    return bytes.fromhex(value.rjust(size * 2, "0"))
+
+
+def isAddress(value):
+    if not isinstance(value, str) or len(value) != 42 or not value.startswith("0x"):
+        return False
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def toJson(value):
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + value.hex()
+    raise TypeError(f"cannot store {type(value)}")
+
+
+def columnKind(values):
+    if all(isinstance(v, bool) for v in values):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        if all(INT64_MIN <= v <= INT64_MAX for v in values):
+            return "int64"
+        if all(0 <= v < 2**256 for v in values):
+            return "uint256"
+        if all(-(2**255) <= v < 2**255 for v in values):
+            return "int256"
+    if all(isAddress(v) for v in values):
+        return "address"
+    return "json"
+
+
+def encodeColumn(values, kind):
+    if kind == "bool":
+        return np.array(values, dtype=np.bool_)
+    if kind == "int64":
+        return np.array(values, dtype=np.int64)
+    if kind == "uint256":
+        raw = b"".join(v.to_bytes(32, "big") for v in values)
+        return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 32)
+    if kind == "int256":
+        raw = b"".join(v.to_bytes(32, "big", signed=True) for v in values)
+        return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 32)
+    if kind == "address":
+        raw = b"".join(fromHex(v, 20) for v in values)
+        return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 20)
+    return np.array([json.dumps(v, default=toJson) for v in values], dtype=np.str_)
+
+
+def decodeColumn(column, kind):
+    if kind in ("bool", "int64"):
+        return column.tolist()
+    if kind == "uint256":
+        return [int.from_bytes(row.tobytes(), "big") for row in column]
+    if kind == "int256":
+        return [int.from_bytes(row.tobytes(), "big", signed=True) for row in column]
+    if kind == "address":
+        return [checksum("0x" + row.tobytes().hex()) for row in column]
+    return [json.loads(v) for v in column.tolist()]
+
+
+# stores each segment as typed numpy columns in a compressed .npz instead of
+# nested json, block numbers are sorted so range reads are a searchsorted slice
+class ColumnarFileHandler(FileHandler):
+    extension = "npz"
+
+    def writeFile(self, file, data, indent=None):
+        blocks, logIndexes, txHashes, addresses, eventIds = [], [], [], [], []
+        names = []
+        nameIds = {}
+        eventArgs = {}
+        row = 0
+        for block in sorted(data, key=int):
+            for txHash, txEvents in data[block].items():
+                for address, addressEvents in txEvents.items():
+                    for key, args in addressEvents.items():
+                        name, logIndex = key.rsplit(" ", 1)
+                        if name not in nameIds:
+                            nameIds[name] = len(names)
+                            names.append(name)
+                            eventArgs[name] = {"rows": [], "args": {}}
+                        blocks.append(int(block))
+                        logIndexes.append(int(logIndex))
+                        txHashes.append(fromHex(txHash, 32))
+                        addresses.append(fromHex(address, 20))
+                        eventIds.append(nameIds[name])
+                        eventArgs[name]["rows"].append(row)
+                        for arg, value in args.items():
+                            eventArgs[name]["args"].setdefault(arg, {})[row] = value
+                        row += 1
+
+        columns = {
+            "block": np.array(blocks, dtype=np.int64),
+            "logIndex": np.array(logIndexes, dtype=np.int32),
+            "txHash": np.frombuffer(b"".join(txHashes), dtype=np.uint8).reshape(-1, 32),
+            "address": np.frombuffer(b"".join(addresses), dtype=np.uint8).reshape(
+                -1, 20
+            ),
+            "event": np.array(eventIds, dtype=np.uint16),
+        }
+        schema = []
+        for k, name in enumerate(names):
+            rows = eventArgs[name]["rows"]
+            fields = []
+            columns[f"e{k}_rows"] = np.array(rows, dtype=np.int64)
+            for j, (arg, byRow) in enumerate(eventArgs[name]["args"].items()):
+                values = [byRow.get(r) for r in rows]
+                kind = "json" if len(byRow) != len(rows) else columnKind(values)
+                columns[f"e{k}_{j}"] = encodeColumn(values, kind)
+                fields.append([arg, kind])
+            schema.append([name, fields])
+        columns["schema"] = np.array(json.dumps(schema))
+        with open(self.filePath + file, "wb") as f:
+            np.savez_compressed(f, **columns)
+
+    def loadFile(self, file):
+        return self.loadRange(file, None, None)
+
+    def loadRange(self, file, start, end):
+        with np.load(self.filePath + file) as columns:
+            blocks = columns["block"]
+            lo = 0 if start is None else int(np.searchsorted(blocks, start, "left"))
+            hi = (
+                len(blocks)
+                if end is None
+                else int(np.searchsorted(blocks, end, "right"))
+            )
+            if lo >= hi:
+                return {}
+            return self.rowsToData(columns, lo, hi)
+
+    def iterBlocks(self, file, start, end):
+        return iter(self.loadRange(file, start, end).items())
+
+    def rowsToData(self, columns, lo, hi):
+        schema = json.loads(columns["schema"].item())
+        args = [{} for i in range(hi - lo)]
+        for k, (name, fields) in enumerate(schema):
+            rows = columns[f"e{k}_rows"]
+            first, last = np.searchsorted(rows, [lo, hi])
+            rows = (rows[first:last] - lo).tolist()
+            for j, (arg, kind) in enumerate(fields):
+                values = decodeColumn(columns[f"e{k}_{j}"][first:last], kind)
+                for row, value in zip(rows, values):
+                    args[row][arg] = value
+
+        names = [name for name, fields in schema]
+        blocks = columns["block"][lo:hi].tolist()
+        logIndexes = columns["logIndex"][lo:hi].tolist()
+        eventIds = columns["event"][lo:hi].tolist()
+        txHashes = columns["txHash"][lo:hi]
+        addresses = columns["address"][lo:hi]
+        data = {}
+        for i in range(hi - lo):
+            txHash = "0x" + txHashes[i].tobytes().hex()
+            address = checksum("0x" + addresses[i].tobytes().hex())
+            key = f"{names[eventIds[i]]} {logIndexes[i]}"
+            blockData = data.setdefault(str(blocks[i]), {})
+            blockData.setdefault(txHash, {}).setdefault(address, {})[key] = args[i]
+        return data
@@ -4,24 +4,34 @@ import os
 
 
 load_dotenv()
+settingsPath = f"{os.path.dirname(os.path.abspath(__file__))}/settings/"
 folderPath = os.getenv("FOLDER_PATH")
-configPath = f"{os.path.dirname(os.path.abspath(__file__))}/settings/{folderPath}/"
+configPath = f"{settingsPath}{folderPath}/"
 with open(configPath + "config.json") as f:
     cfg = json.load(f)
 
 
+# config path and settings of another folder under settings/, used for the
+# tenants whose events are fanned out from this scan
+def loadTenant(folder):
+    path = f"{settingsPath}{folder}/"
+    with open(path + "config.json") as f:
+        return path, json.load(f)
+
+
 fileSettings = cfg["FILESETTINGS"]
 scanSettings = cfg["SCANSETTINGS"]
 rpcSettings = cfg["RPCSETTINGS"]
 rpcInterfaceSettings = cfg["RPCINTERFACE"]
-hreSettings = cfg["HRE"]
+hreSettings = cfg.get("HRE", {})
 
 
 def overrideSettings(rpcSetting):
     for key, value in cfg["RPCOVERRIDE"].items():
         if value != "":
             rpcSetting[key] = value
-    if rpcSetting["APIURL"] in hreSettings.keys():
+    # hardhat settings given inline are used as they are
+    if isinstance(rpcSetting["APIURL"], str) and rpcSetting["APIURL"] in hreSettings:
         rpcSetting["APIURL"] = hreSettings[rpcSetting["APIURL"]]
 
 
@@ -0,0 +1,113 @@
+import random
+import sys
+import time
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.events import get_event_data
+from web3.datastructures import AttributeDict
+from eventDecoder import CompiledEvent, checksumAddress, checksumWord, decodeLogs
+
+SYNC = {
+    "anonymous": False,
+    "inputs": [
+        {
+            "indexed": False,
+            "internalType": "uint256",
+            "name": "reserve0",
+            "type": "uint256",
+        },
+        {
+            "indexed": False,
+            "internalType": "uint256",
+            "name": "reserve1",
+            "type": "uint256",
+        },
+    ],
+    "name": "Sync",
+    "type": "event",
+}
+TRANSFER = {
+    "anonymous": False,
+    "inputs": [
+        {"indexed": True, "internalType": "address", "name": "from", "type": "address"},
+        {"indexed": True, "internalType": "address", "name": "to", "type": "address"},
+        {
+            "indexed": False,
+            "internalType": "uint256",
+            "name": "value",
+            "type": "uint256",
+        },
+    ],
+    "name": "Transfer",
+    "type": "event",
+}
+
+
+def randomWord(bits=256):
+    return random.getrandbits(bits).to_bytes(32, "big")
+
+
+def randomAddressTopic():
+    return HexBytes(bytes(12) + random.getrandbits(160).to_bytes(20, "big"))
+
+
+def makeLogs(abi, count):
+    topic0 = HexBytes(
+        Web3.keccak(text=f"{abi['name']}({','.join(i['type'] for i in abi['inputs'])})")
+    )
+    indexed = [i for i in abi["inputs"] if i["indexed"]]
+    data = [i for i in abi["inputs"] if not i["indexed"]]
+    logs = []
+    for n in range(count):
+        logs.append(
+            AttributeDict(
+                {
+                    "address": Web3.to_checksum_address(
+                        random.getrandbits(160).to_bytes(20, "big")
+                    ),
+                    "topics": [topic0] + [randomAddressTopic() for i in indexed],
+                    "data": HexBytes(b"".join(randomWord(112) for i in data)),
+                    "blockNumber": 15000000 + n // 4,
+                    "transactionHash": HexBytes(randomWord()),
+                    "transactionIndex": n % 50,
+                    "blockHash": HexBytes(randomWord()),
+                    "logIndex": n,
+                    "removed": False,
+                }
+            )
+        )
+    return logs
+
+
+def benchmark(abi, count):
+    codec = Web3().codec
+    logs = makeLogs(abi, count)
+    compiled = CompiledEvent(abi, codec)
+
+    startTime = time.time()
+    before = [dict(get_event_data(codec, abi, log)["args"]) for log in logs]
+    beforeRate = count / (time.time() - startTime)
+
+    checksumWord.cache_clear()
+    checksumAddress.cache_clear()
+    startTime = time.time()
+    after = [compiled.decodeArgs(log) for log in logs]
+    afterRate = count / (time.time() - startTime)
+
+    checksumWord.cache_clear()
+    checksumAddress.cache_clear()
+    startTime = time.time()
+    batched = decodeLogs([(log, compiled) for log in logs])
+    batchRate = count / (time.time() - startTime)
+
+    assert before == after, "compiled decoder output differs from get_event_data"
+    assert before == batched, "batched decoder output differs from get_event_data"
+    print(
+        f"{abi['name']}: get_event_data {beforeRate:,.0f} events/s, compiled {afterRate:,.0f} events/s ({afterRate / beforeRate:.1f}x), batched {batchRate:,.0f} events/s ({batchRate / beforeRate:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    benchmark(SYNC, count)
+    benchmark(TRANSFER, count)
@@ -0,0 +1,248 @@
+import re
+from functools import lru_cache
+import numpy as np
+from eth_utils import to_checksum_address
+from web3._utils.abi import (
+    exclude_indexed_event_inputs,
+    get_abi_input_names,
+    get_indexed_event_inputs,
+    map_abi_data,
+    named_tree,
+    normalize_event_input_types,
+)
+from web3._utils.events import get_event_abi_types_for_decoding
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+
+STATICTYPE = re.compile(r"^(uint|int|address|bool|bytes)(\d*)$")
+# groups smaller than this are cheaper to decode one log at a time
+BATCHMIN = 64
+
+
+@lru_cache(maxsize=65536)
+def checksumWord(word):
+    return to_checksum_address(word[12:])
+
+
+def wordDecoder(abiType):
+    match = STATICTYPE.match(abiType)
+    if match is None:
+        return None
+    kind, size = match.groups()
+    if kind == "uint":
+        return lambda word: int.from_bytes(word, "big")
+    if kind == "int":
+        return lambda word: int.from_bytes(word, "big", signed=True)
+    if kind == "address":
+        return checksumWord
+    if kind == "bool":
+        return lambda word: word[31] != 0
+    if size:
+        size = int(size)
+        return lambda word: word[:size]
+    return None
+
+
+@lru_cache(maxsize=65536)
+def checksumAddress(raw):
+    return to_checksum_address(raw)
+
+
+def uint64Column(words, offset, dtype=">u8"):
+    return np.ascontiguousarray(words[:, offset : offset + 8]).view(dtype).reshape(-1)
+
+
+# ints wider than 64 bits are split into 64 bit limbs and recombined as object
+# arrays, unsigned columns whose upper limbs are all zero skip those limbs
+def intColumn(words, signed, limbs):
+    offsets = list(range(32 - 8 * limbs, 32, 8))
+    if not signed and limbs > 2:
+        upper = np.zeros(len(words), dtype=np.uint64)
+        for offset in offsets[:-2]:
+            upper |= uint64Column(words, offset)
+        if not upper.any():
+            offsets = offsets[-2:]
+    if len(offsets) == 1:
+        return uint64Column(words, offsets[0], ">i8" if signed else ">u8").tolist()
+    value = None
+    for k, offset in enumerate(offsets):
+        limb = uint64Column(words, offset, ">i8" if signed and k == 0 else ">u8")
+        limb = limb.astype(object)
+        value = limb if value is None else (value << 64) + limb
+    return value.tolist()
+
+
+# decodes one word position of every log at once, None when the type has no
+# vectorized form
+def columnDecoder(abiType):
+    match = STATICTYPE.match(abiType)
+    if match is None:
+        return None
+    kind, size = match.groups()
+    size = int(size) if size else 256
+    if kind in ("uint", "int"):
+        limbs = -(-size // 64)
+        return lambda words: intColumn(words, kind == "int", limbs)
+    if kind == "bool":
+        return lambda words: (words[:, 31] != 0).tolist()
+    if kind == "address":
+
+        def decodeAddresses(words):
+            raw = np.ascontiguousarray(words[:, 12:]).tobytes()
+            return [checksumAddress(raw[i : i + 20]) for i in range(0, len(raw), 20)]
+
+        return decodeAddresses
+    return None
+
+
+# converts a log straight from json-rpc into the fields the decoders use,
+# the transaction hash stays a hex string
+def fromRawLog(log):
+    return {
+        "address": checksumAddress(log["address"]),
+        "topics": [bytes.fromhex(topic[2:]) for topic in log["topics"]],
+        "data": bytes.fromhex(log["data"][2:]),
+        "blockNumber": int(log["blockNumber"], 16),
+        "logIndex": int(log["logIndex"], 16),
+        "transactionHash": log["transactionHash"],
+        "blockHash": log["blockHash"],
+        "removed": log.get("removed", False),
+    }
+
+
+def toBytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return value
+
+
+# an abi event compiled once: names, types and per word decoders are worked out
+# here instead of on every log like web3's get_event_data
+class CompiledEvent:
+    def __init__(self, abi, codec):
+        self.name = abi["name"]
+        self.codec = codec
+        topicInputs = normalize_event_input_types(get_indexed_event_inputs(abi))
+        self.topicTypes = get_event_abi_types_for_decoding(topicInputs)
+        self.topicNames = get_abi_input_names({"inputs": topicInputs})
+        self.dataInputs = normalize_event_input_types(exclude_indexed_event_inputs(abi))
+        self.dataTypes = get_event_abi_types_for_decoding(self.dataInputs)
+        self.dataNames = get_abi_input_names({"inputs": self.dataInputs})
+        self.topicDecoders = [wordDecoder(t) for t in self.topicTypes]
+        dataDecoders = [wordDecoder(t) for t in self.dataTypes]
+        # all static single word layouts like Sync(uint112,uint112) are sliced
+        if all(dataDecoders):
+            self.dataDecoders = list(zip(self.dataNames, dataDecoders))
+            self.decodeData = self.decodeStaticData
+        else:
+            self.dataDecoders = None
+            self.decodeData = self.decodeDynamicData
+        self.dataSize = 32 * len(self.dataTypes)
+        self.columnDecoders = [columnDecoder(t) for t in self.dataTypes]
+        self.batchable = self.dataDecoders is not None and all(self.columnDecoders)
+
+    def decodeStaticData(self, data):
+        if len(data) < self.dataSize:
+            raise ValueError(
+                f"{self.name} expects {self.dataSize} bytes of data, got {len(data)}"
+            )
+        return {
+            name: decoder(data[i * 32 : i * 32 + 32])
+            for i, (name, decoder) in enumerate(self.dataDecoders)
+        }
+
+    def decodeDynamicData(self, data):
+        decoded = self.codec.decode(self.dataTypes, data)
+        normalized = map_abi_data(BASE_RETURN_NORMALIZERS, self.dataTypes, decoded)
+        return dict(named_tree(self.dataInputs, normalized))
+
+    def decodeTopics(self, topics):
+        args = {}
+        for name, abiType, decoder, topic in zip(
+            self.topicNames, self.topicTypes, self.topicDecoders, topics
+        ):
+            topic = toBytes(topic)
+            if decoder is None:
+                value = self.codec.decode([abiType], topic)[0]
+                value = map_abi_data(BASE_RETURN_NORMALIZERS, [abiType], [value])[0]
+            else:
+                value = decoder(topic)
+            args[name] = value
+        return args
+
+    # decodes many logs of this event with numpy, the data of every log is
+    # joined into one buffer and each word position is decoded as a column
+    def decodeBatch(self, logs):
+        datas = [toBytes(log["data"]) for log in logs]
+        if any(len(data) != self.dataSize for data in datas) or any(
+            len(log["topics"]) - 1 != len(self.topicTypes) for log in logs
+        ):
+            return [self.decodeArgs(log) for log in logs]
+        words = np.frombuffer(b"".join(datas), dtype=np.uint8).reshape(
+            len(logs), len(self.dataTypes), 32
+        )
+        columns = [
+            decoder(words[:, i, :]) for i, decoder in enumerate(self.columnDecoders)
+        ]
+        results = []
+        for n, row in enumerate(zip(*columns)):
+            args = self.decodeTopics(logs[n]["topics"][1:]) if self.topicTypes else {}
+            args.update(zip(self.dataNames, row))
+            results.append(args)
+        return results
+
+    def decodeArgs(self, log):
+        topics = log["topics"]
+        if len(topics) - 1 != len(self.topicTypes):
+            raise ValueError(
+                f"{self.name} expects {len(self.topicTypes)} indexed topics, got {len(topics) - 1}"
+            )
+        args = self.decodeTopics(topics[1:])
+        args.update(self.decodeData(toBytes(log["data"])))
+        return args
+
+
+# decodes (log, decoder) pairs, batching logs that share a fixed layout decoder,
+# returns the args of each log in the same order
+def decodeLogs(matched, batchMin=BATCHMIN):
+    groups = {}
+    for i, (log, decoder) in enumerate(matched):
+        groups.setdefault(decoder, []).append(i)
+    decodedArgs = [None] * len(matched)
+    for decoder, indexes in groups.items():
+        logs = [matched[i][0] for i in indexes]
+        if decoder.batchable and len(logs) >= batchMin:
+            decoded = decoder.decodeBatch(logs)
+        else:
+            decoded = [decoder.decodeArgs(log) for log in logs]
+        for i, args in zip(indexes, decoded):
+            decodedArgs[i] = args
+    return decodedArgs
+
+
+def topicKey(eventSig):
+    return bytes.fromhex(eventSig[2:] if eventSig.startswith("0x") else eventSig)
+
+
+# keys decoders the way RPC.decodeEvents looks them up: by (address, topic0)
+# for ANYEVENT and by (topic0, number of topics) for ANYCONTRACT
+def compileDecoders(scanMode, contracts, abiLookups, codec):
+    compiled = {}
+    decoders = {}
+
+    def compileAbi(eventSig, abi):
+        key = (eventSig, len(get_indexed_event_inputs(abi)))
+        if key not in compiled:
+            compiled[key] = CompiledEvent(abi, codec)
+        return compiled[key]
+
+    if scanMode == "ANYEVENT":
+        for address, events in contracts.items():
+            for eventSig, abi in events.items():
+                if abi.get("anonymous"):
+                    continue
+                decoders[(address, topicKey(eventSig))] = compileAbi(eventSig, abi)
+    elif scanMode == "ANYCONTRACT":
+        for eventSig, lookup in abiLookups.items():
+            for numTopics, abi in lookup.items():
+                decoders[(topicKey(eventSig), numTopics)] = compileAbi(eventSig, abi)
+    return decoders
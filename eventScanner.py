@@ -6,7 +6,14 @@ from tqdm import tqdm
 import os
 from logger import Logger
 import multiprocessing
-from configLoader import scanSettings, rpcSettings, configPath, rpcInterfaceSettings
+from configLoader import (
+    scanSettings,
+    rpcSettings,
+    configPath,
+    rpcInterfaceSettings,
+    folderPath,
+    loadTenant,
+)
 from scannerRpcInterface import JobManager
 import atexit
 from scannerRpcInterface import IfixedScan, IJobManager, IliveScan
@@ -14,7 +21,12 @@ import asyncio
 
 directory = os.path.dirname(os.path.abspath(__file__))
 from rpc import RPC
-from fileHandler import FileHandler
+from asyncRpc import AsyncRPC
+from fileHandler import getFileHandler
+from tenantFileHandler import Tenant, TenantFileHandler
+from chunkController import loadDensity, planJobs, excludeRanges
+from scheduler import Scheduler
+from rateLimiter import getRateLimiters, rateKey
 
 
 def scan():
@@ -46,15 +58,23 @@ class EventScanner(Logger):
     def __init__(self):
         atexit.register(self.teardown)
         self.loadSettings(scanSettings, rpcSettings)
-        self.fileHandler = FileHandler()
+        self.fileHandler = self.initFileHandler()
 
     def loadSettings(self, scanSettings, rpcSettings):
         Logger.setProcessName(scanSettings["NAME"])
         super().__init__(scanSettings["DEBUGLEVEL"])
         self.scanMode = scanSettings["MODE"]
         self.events = scanSettings["EVENTS"]
-        self.loadAbis()
-        self.processContracts(scanSettings["CONTRACTS"])
+        self.contracts = {}
+        self.abiLookups = {}
+        # topic0s of every known event by name and argument names, decoded
+        # events only carry those
+        self.eventTopics = {}
+        self.abis = self.loadAbis(configPath)
+        self.topic0s = self.processContracts(
+            scanSettings["CONTRACTS"], self.abis, self.events
+        )
+        self.loadTenants(scanSettings.get("TENANTS", []))
         self.initRpcs(rpcSettings)
 
         if scanSettings["STARTBLOCK"] == "current":
@@ -67,18 +87,68 @@ class EventScanner(Logger):
             self.endBlock = scanSettings["ENDBLOCK"]
         self.liveThreshold = scanSettings["LIVETHRESHOLD"]
 
-    def processContracts(self, contracts):
-        self.contracts = {}
-        self.abiLookups = {}
+    # returns the topic0s of the selected events
+    def processContracts(self, contracts, abis, events):
+        topic0s = set()
         for contract, abiFile in contracts.items():
             checksumAddress = Web3.to_checksum_address(contract)
-            self.contracts[checksumAddress] = {}
-            for entry in self.abis[abiFile]:
+            self.contracts.setdefault(checksumAddress, {})
+            for entry in abis[abiFile]:
                 if entry["type"] == "event":
                     eventSig, topicCount = processEvents(entry)
                     self.contracts[checksumAddress][eventSig] = entry
-                    if entry["name"] in self.events:
-                        self.abiLookups[eventSig] = {topicCount: entry}
+                    argNames = frozenset(i["name"] for i in entry["inputs"])
+                    self.eventTopics.setdefault((entry["name"], argNames), set()).add(
+                        eventSig
+                    )
+                    if entry["name"] in events:
+                        self.abiLookups.setdefault(eventSig, {})[topicCount] = entry
+                        topic0s.add(eventSig)
+        return topic0s
+
+    # configurations scanned alongside this one, their contracts and events
+    # join the filter and their share of the results goes to their own files
+    def loadTenants(self, folders):
+        self.tenants = []
+        for folder in folders:
+            path, cfg = loadTenant(folder)
+            settings = cfg["SCANSETTINGS"]
+            if settings["MODE"] != self.scanMode:
+                raise ValueError(
+                    f"tenant {folder} scans {settings['MODE']}, expected {self.scanMode}"
+                )
+            topic0s = self.processContracts(
+                settings["CONTRACTS"], self.loadAbis(path), settings["EVENTS"]
+            )
+            self.tenants.append((folder, path, cfg, topic0s))
+        if self.tenants:
+            self.logInfo(f"fetching for tenants {[t[0] for t in self.tenants]}")
+
+    def initFileHandler(self):
+        fileHandler = getFileHandler()
+        if not self.tenants:
+            return fileHandler
+        tenants = [
+            Tenant(
+                folderPath,
+                self.scanMode,
+                scanSettings,
+                fileHandler,
+                self.topic0s,
+                self.eventTopics,
+            )
+        ] + [
+            Tenant(
+                folder,
+                self.scanMode,
+                cfg["SCANSETTINGS"],
+                getFileHandler(cfg["FILESETTINGS"], path),
+                topic0s,
+                self.eventTopics,
+            )
+            for folder, path, cfg, topic0s in self.tenants
+        ]
+        return TenantFileHandler(tenants, scanSettings["DEBUGLEVEL"])
 
     def getCurrentBlock(self):
         if self.rpc:
@@ -88,28 +158,51 @@ class EventScanner(Logger):
             self.logInfo(f"current block is {block}")
             return block
 
-    def loadAbis(self):
-        self.abis = {}
-        files = os.listdir(configPath + "ABIs/")
+    def loadAbis(self, path):
+        abis = {}
+        files = os.listdir(path + "ABIs/")
         for file in files:
             if file.endswith(".json"):
-                self.abis[file[:-5]] = json.load(open(configPath + "ABIs/" + file))
+                abis[file[:-5]] = json.load(open(path + "ABIs/" + file))
+        return abis
 
     def initRpcs(self, rpcSettings):
         self.processes = []
         self.rpc = None
-        if scanSettings["RPC"] is not None and scanSettings["RPC"]["ENABLED"] == True:
+        scannerEnabled = (
+            scanSettings["RPC"] is not None and scanSettings["RPC"]["ENABLED"] == True
+        )
+        # only endpoints taking fixed scan jobs get a scheduler slot, the
+        # scanner's own rpc is the last one, everything else gets -1
+        endpoints = []
+        slots = 0
+        for rpcSetting in rpcSettings:
+            if 1 in rpcSetting["ACTIVESTATES"]:
+                endpoints.append(slots)
+                slots += 1
+            else:
+                endpoints.append(-1)
+        self.scheduler = Scheduler(slots + scannerEnabled, rpcInterfaceSettings)
+        # processes hitting the same provider key share one limiter
+        self.limiters = getRateLimiters(
+            rpcSettings + [s for s in [scanSettings["RPC"]] if s is not None]
+        )
+        if scannerEnabled:
             self.rpc = RPC(
                 scanSettings["RPC"],
                 scanSettings["MODE"],
                 self.contracts,
                 self.abiLookups,
                 updateProcName=False,
+                scheduler=self.scheduler,
+                endpoint=slots,
+                limiter=self.limiters.get(rateKey(scanSettings["RPC"])),
+                backupLimiters=self.limiters,
             )
-        for rpcSetting in rpcSettings:
+        for endpoint, rpcSetting in zip(endpoints, rpcSettings):
             process = multiprocessing.Process(
                 target=self.initRPCProcess,
-                args=(rpcSetting,),
+                args=(rpcSetting, endpoint),
             )
             self.processes.append(process)
             process.start()
@@ -128,16 +221,26 @@ class EventScanner(Logger):
         IJobManager.state = -1
         self.fileHandler.save()
 
-    def initRPCProcess(self, settings):
-        rpc = RPC(
+    def initRPCProcess(self, settings, endpoint):
+        if settings.get("CONCURRENCY", 1) > 1:
+            rpcClass = AsyncRPC
+        else:
+            rpcClass = RPC
+        rpc = rpcClass(
             settings,
             self.scanMode,
             self.contracts,
             self.abiLookups,
+            self.scheduler if endpoint >= 0 else None,
+            endpoint,
+            self.limiters.get(rateKey(settings)),
+            self.limiters,
         )
         try:
             rpc.run()
         except Exception as e:
+            if endpoint >= 0:
+                self.scheduler.retire(endpoint)
             self.logCritical(f"process failed {e}")
 
     def updateProgress(
@@ -161,7 +264,13 @@ class EventScanner(Logger):
     def scanFixedEnd(self, start, endBlock):
         startTime = time.time()
         totalBlocks = endBlock - start
-        IfixedScan.addScanRange(start, endBlock)
+        if scanSettings.get("PLANJOBS", False):
+            jobs = self.planScan(start, endBlock)
+        else:
+            jobs = [(start, endBlock)]
+        # ranges are added back to front, the allocator hands out its front
+        for job in reversed(jobs):
+            IfixedScan.addScanRange(*job)
         IJobManager.state = 1
         self.logInfo(
             f"starting fixed scan at {time.asctime(time.localtime(startTime))}, scanning {start} to {endBlock}",
@@ -176,6 +285,7 @@ class EventScanner(Logger):
                 else:
                     results = IfixedScan.waitResults()
                 numBlocks = self.fileHandler.process(results)
+                IfixedScan.setScanLimit(self.fileHandler.getScanLimit())
                 self.updateProgress(
                     progress_bar,
                     startTime,
@@ -194,6 +304,29 @@ class EventScanner(Logger):
         self.fileHandler.save()
         return endBlock
 
+    def planScan(self, start, end):
+        settings = rpcSettings or [scanSettings["RPC"]]
+        regionSize = settings[0].get("DENSITYREGION", 100000) or 100000
+        eventsTarget = min(s["EVENTSTARGET"] for s in settings)
+        maxChunkSize = min(s["MAXCHUNKSIZE"] for s in settings)
+        density = loadDensity(configPath + "chunks/")
+        samples = scanSettings.get("PLANSAMPLES", 0)
+        regions = range(start // regionSize, (end - 1) // regionSize + 1)
+        windows = []
+        if samples and any(region not in density for region in regions):
+            if self.rpc:
+                sampled, windows = self.rpc.sampleDensity(start, end, samples)
+            else:
+                sampled, windows = IJobManager.addJob(
+                    "sampleDensity", start, end, samples
+                )
+            density.update(sampled)
+        plan = planJobs(start, end, density, regionSize, eventsTarget, maxChunkSize)
+        # the sampled windows were stored already
+        plan = excludeRanges(plan, windows)
+        self.logInfo(f"planned {len(plan)} ranges for {start}-{end}: {plan}")
+        return plan
+
     def scanBlocks(
         self, start=None, end=None, resultsOut=None, callback=None, storeResults=True
     ):
@@ -252,11 +385,21 @@ class EventScanner(Logger):
     #         self.interrupt()
     #     return self.fileHandler.latest
 
-    def getEvents(self, start, end, results=[]):
+    def getEvents(self, start, end, results=None):
+        if results is None:
+            results = []
         self.scanMissingBlocks(start, end)
         self.fileHandler.getEvents(start, end, results)
         return results
 
+    def iterEvents(self, start, end, addresses=None, events=None):
+        self.scanMissingBlocks(start, end)
+        yield from self.fileHandler.iterEvents(start, end, addresses, events)
+
+    # latest stored event of a contract, without replaying its history
+    def getLatest(self, address, event):
+        return self.fileHandler.getLatest(address, event)
+
     def scanLive(
         self,
         resultsOut=None,
@@ -1,27 +1,179 @@
 import os
 import json
+import bisect
+import heapq
+import itertools
 import time
+import struct
+import zlib
 from logger import Logger
 from configLoader import fileSettings, configPath
+from reorgTracker import ROLLBACK
+from latestView import LatestView
+
+# length and crc32 of each json record appended to a segment log
+RECORDHEADER = struct.Struct(">II")
+MANIFEST = "segments.manifest"
+
+
+# yields the top level items of a json object file without loading all of it
+def iterJsonItems(path, chunkSize=1 << 20):
+    decoder = json.JSONDecoder()
+    with open(path) as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def more():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunkSize)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return not eof
+
+        def nextToken(skip=""):
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and (
+                    buffer[pos].isspace() or buffer[pos] in skip
+                ):
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not more():
+                    return None
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # a value ending at the buffer edge may be a truncated number
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more()
+
+        if nextToken() != "{":
+            raise ValueError(f"{path} is not a json object")
+        pos += 1
+        while True:
+            token = nextToken(",")
+            if token is None or token == "}":
+                return
+            key = decode()
+            if nextToken() != ":":
+                raise ValueError(f"{path} missing ':' after {key}")
+            pos += 1
+            nextToken()
+            yield key, decode()
+
+
+# json text of a segment written block by block, laid out like json.dumps,
+# with the (offset, length) of each block's value so it can be read alone
+def encodeSegment(data, indent=None):
+    if not data:
+        return "{}", {}
+    if indent is None:
+        pad, separator, newline = "", ", ", ""
+    else:
+        pad, separator, newline = " " * indent, ",\n", "\n"
+    parts = ["{" + newline]
+    offset = len(parts[0])
+    offsets = {}
+    for i, (block, blockData) in enumerate(data.items()):
+        key = (separator if i else "") + pad + json.dumps(str(block)) + ": "
+        value = json.dumps(blockData, indent=indent).replace("\n", newline + pad)
+        offset += len(key)
+        offsets[str(block)] = [offset, len(value)]
+        offset += len(value)
+        parts += [key, value]
+    parts.append(newline + "}")
+    return "".join(parts), offsets
+
+
+# secondary index of a segment: blocks holding each address and event name,
+# and where each block sits in the file
+def buildIndex(data, offsets, size):
+    addresses = {}
+    events = {}
+    for block, blockData in data.items():
+        for txEvents in blockData.values():
+            for address, addressEvents in txEvents.items():
+                addresses.setdefault(address.lower(), set()).add(int(block))
+                for key in addressEvents:
+                    events.setdefault(key.rsplit(" ", 1)[0], set()).add(int(block))
+    return {
+        "size": size,
+        "blocks": offsets,
+        "addresses": {address: sorted(b) for address, b in addresses.items()},
+        "events": {name: sorted(b) for name, b in events.items()},
+    }
+
+
+def indexedBlocks(index, start, end, addresses=None, events=None):
+    blocks = None
+    if addresses is not None:
+        blocks = set().union(*(index["addresses"].get(a, []) for a in addresses))
+    if events is not None:
+        eventBlocks = set().union(*(index["events"].get(e, []) for e in events))
+        blocks = eventBlocks if blocks is None else blocks & eventBlocks
+    return sorted(block for block in blocks if start <= block <= end)
+
+
+def iterBlockEvents(block, blockData, addresses=None, events=None):
+    for txHash, txEvents in blockData.items():
+        for address, addressEvents in txEvents.items():
+            if addresses is not None and address.lower() not in addresses:
+                continue
+            for key, args in addressEvents.items():
+                name, logIndex = key.rsplit(" ", 1)
+                if events is not None and name not in events:
+                    continue
+                yield block, txHash, address, name, int(logIndex), args
 
 
 # currently assumes all files stored are sequential
 class FileHandler(Logger):
-    def __init__(self):
-        super().__init__(fileSettings["DEBUGLEVEL"])
-        filePath = configPath + fileSettings["FILENAME"] + "/"
+    extension = "json"
+
+    def __init__(self, settings=None, path=None):
+        if settings is None:
+            settings, path = fileSettings, configPath
+        super().__init__(settings["DEBUGLEVEL"])
+        filePath = path + settings["FILENAME"] + "/"
         os.makedirs(filePath, exist_ok=True)
         self.currentFile = None
         self.currentData = {}
         self.start = 0
         self.filePath = filePath
-        self.maxEntries = fileSettings["MAXENTRIES"]
-        self.saveInterval = fileSettings["SAVEINTERVAL"]
+        self.maxEntries = settings["MAXENTRIES"]
+        self.saveInterval = settings["SAVEINTERVAL"]
+        # heap of (start, arrival, result) waiting for the blocks before them
         self.pending = []
+        self.pendingCount = itertools.count()
+        self.pendingBytes = 0
+        self.maxPendingBytes = settings.get("MAXPENDINGBYTES", 1 << 28)
         self.latest = 0
         self.maxBlock = 0
         self.next = None
         self.lastSave = time.time()
+        self.unsaved = {}
+        # blocks rolled back since the last save, replayed as deletions
+        self.removed = set()
+        self.baseFile = None
+        # segment indexes loaded so far, by segment file name
+        self.indexes = {}
+        self.latestView = None
+        self.viewPath = None
+        if settings.get("LATESTVIEW", False):
+            self.viewPath = filePath + "latest.view"
+        recovered = self.recover()
+        self.loadManifest(rebuild=recovered)
 
     def createNewFile(self, startBlock=None):
         if startBlock is None:
@@ -30,35 +182,194 @@ class FileHandler(Logger):
 
         self.currentFile = (self.start, self.latest)
         self.currentData = {}
+        self.unsaved = {}
+        self.baseFile = None
         self.logInfo(f"new file created starting {self.latest}")
 
     @property
     def currentFileName(self):
-        return f"{self.currentFile[0]}.{self.currentFile[1]}.json"
-
-    def save(self, deleteOld=True, indent=None):
-        if self.currentData and self.latest != self.start:
-            newName = f"{self.start}.{self.latest}.json"
-            with open(self.filePath + newName, "w") as f:
-                f.write(json.dumps(self.currentData, indent=indent))
-            if deleteOld and newName != self.currentFileName:
-                self.logDebug(f"deleting {self.currentFile}")
-                try:
-                    os.remove(self.filePath + self.currentFileName)
-                except FileNotFoundError as e:
-                    self.logDebug("filenotfound error deleting {e}")
-            self.currentFile = (self.start, self.latest)
-            self.lastSave = time.time()
-            self.logInfo(f"current data saved to {self.currentFileName}")
-        else:
+        return self.toFileName(self.currentFile)
+
+    # appends the blocks merged since the last save to the segment log, the
+    # log is renamed to the new end block and recorded in the manifest
+    def save(self):
+        if self.currentFile is None or (
+            not self.unsaved and not self.removed and self.latest == self.currentFile[1]
+        ):
             self.logDebug(f"{self.currentFile} not saved, no changed data")
+            return
+        record = json.dumps([self.latest, self.unsaved, sorted(self.removed)]).encode()
+        logName = self.toLogName(self.currentFile)
+        with open(self.filePath + logName, "ab") as f:
+            f.write(RECORDHEADER.pack(len(record), zlib.crc32(record)) + record)
+            f.flush()
+            os.fsync(f.fileno())
+        newFile = (self.start, self.latest)
+        if newFile != self.currentFile:
+            os.replace(self.filePath + logName, self.filePath + self.toLogName(newFile))
+            self.updateManifest(newFile)
+        self.currentFile = newFile
+        self.unsaved = {}
+        self.removed = set()
+        self.lastSave = time.time()
+        self.saveView()
+        self.logInfo(f"new data appended to {self.toLogName(self.currentFile)}")
+
+    # rewrites the segment as a final file once and drops its log
+    def compact(self, indent=None):
+        self.save()
+        logName = self.toLogName(self.currentFile)
+        if not os.path.exists(self.filePath + logName):
+            return
+        newName = self.currentFileName
+        self.writeSegment(newName, self.currentData, indent)
+        os.remove(self.filePath + logName)
+        if self.baseFile is not None and self.baseFile != newName:
+            self.logDebug(f"deleting {self.baseFile}")
+            self.removeSegment(self.baseFile)
+        self.baseFile = newName
+        self.logInfo(f"{logName} compacted to {newName}")
+
+    # storages that can't read single blocks back write no index
+    def writeSegment(self, file, data, indent=None):
+        offsets = self.writeFile(file + ".tmp", data, indent)
+        if offsets is not None:
+            size = os.path.getsize(self.filePath + file + ".tmp")
+            self.writeIndex(file, buildIndex(data, offsets, size))
+        os.replace(self.filePath + file + ".tmp", self.filePath + file)
+
+    def removeSegment(self, file):
+        os.remove(self.filePath + file)
+        self.indexes.pop(file, None)
+        try:
+            os.remove(self.filePath + self.toIndexName(file))
+        except FileNotFoundError:
+            pass
+
+    def toIndexName(self, file):
+        return file.rsplit(".", 1)[0] + ".idx"
+
+    def writeIndex(self, file, index):
+        indexName = self.toIndexName(file)
+        with open(self.filePath + indexName + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(self.filePath + indexName + ".tmp", self.filePath + indexName)
+        self.indexes[file] = index
+
+    # None when the segment has no index or was rewritten after it
+    def loadIndex(self, file):
+        if file not in self.indexes:
+            try:
+                with open(self.filePath + self.toIndexName(file)) as f:
+                    self.indexes[file] = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+        index = self.indexes[file]
+        if index["size"] != os.path.getsize(self.filePath + file):
+            self.logWarn(
+                f"index of {file} is stale, reading the whole segment", True, False
+            )
+            del self.indexes[file]
+            return None
+        return index
+
+    def readBlocks(self, file, index, blocks):
+        with open(self.filePath + file, "rb") as f:
+            for block in blocks:
+                offset, length = index["blocks"][str(block)]
+                f.seek(offset)
+                yield block, json.loads(f.read(length))
+
+    def replayLog(self, file, data, end):
+        with open(self.filePath + file, "rb") as f:
+            while True:
+                header = f.read(RECORDHEADER.size)
+                if len(header) < RECORDHEADER.size:
+                    break
+                length, checksum = RECORDHEADER.unpack(header)
+                record = f.read(length)
+                if len(record) < length or zlib.crc32(record) != checksum:
+                    self.logWarn(
+                        f"discarding torn record at end of {file}", True, False
+                    )
+                    break
+                recordEnd, batch, *removed = json.loads(record)
+                for block in removed[0] if removed else []:
+                    data.pop(block, None)
+                data.update(batch)
+                end = max(end, recordEnd)
+        return end
+
+    # segment logs left behind by a crash are replayed onto their base file
+    def recover(self):
+        logs = self.listSegments("wal")
+        for start, logEnd in logs:
+            data = {}
+            end = start
+            bases = [
+                segment
+                for segment in self.listSegments(self.extension)
+                if segment[0] == start
+            ]
+            for base in bases:
+                data.update(self.loadFile(self.toFileName(base)))
+                end = max(end, base[1])
+            logName = self.toLogName((start, logEnd))
+            end = self.replayLog(logName, data, end)
+            newName = self.toFileName((start, end))
+            self.writeSegment(newName, data)
+            os.remove(self.filePath + logName)
+            for base in bases:
+                if self.toFileName(base) != newName:
+                    self.removeSegment(self.toFileName(base))
+            self.logInfo(f"recovered {logName} to {newName}", True)
+        return len(logs) > 0
+
+    # sorted (start, end) index of the segments, persisted next to them so the
+    # directory is only listed when the manifest is missing or after a crash
+    def loadManifest(self, rebuild=False):
+        if not rebuild:
+            try:
+                with open(self.filePath + MANIFEST) as f:
+                    self.segments = [tuple(segment) for segment in json.load(f)]
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.logInfo("segment manifest missing, rebuilding")
+                rebuild = True
+        if rebuild:
+            self.segments = self.scanSegments()
+            self.writeManifest()
+        self.starts = [segment[0] for segment in self.segments]
+
+    def writeManifest(self):
+        with open(self.filePath + MANIFEST + ".tmp", "w") as f:
+            json.dump(self.segments, f)
+        os.replace(self.filePath + MANIFEST + ".tmp", self.filePath + MANIFEST)
+
+    def updateManifest(self, segment):
+        i = bisect.bisect_left(self.starts, segment[0])
+        if i < len(self.starts) and self.starts[i] == segment[0]:
+            self.segments[i] = segment
+        else:
+            self.starts.insert(i, segment[0])
+            self.segments.insert(i, segment)
+        self.writeManifest()
+
+    def getSegment(self, block):
+        i = bisect.bisect_right(self.starts, block) - 1
+        if i < 0 or self.segments[i][1] < block:
+            return None
+        return self.segments[i]
+
+    def filesFrom(self, block):
+        i = max(bisect.bisect_right(self.starts, block) - 1, 0)
+        return self.segments[i:]
 
     def process(self, results):
         for result in results:
             self.addToPending(result)
         numBlocks = self.mergePending()
         if len(self.currentData) > self.maxEntries:
-            self.save(indent=4)
+            self.compact(indent=4)
             self.createNewFile()
         elif (
             time.time() > self.lastSave + self.saveInterval and self.currentData != None
@@ -69,82 +380,227 @@ class FileHandler(Logger):
     def mergePending(self):
         numBlocks = 0
         while len(self.pending) > 0 and self.pending[0][0] <= self.latest:
-            self.currentData.update(self.pending[0][1])
-            self.latest = max(self.pending[0][2], self.latest)
+            element = heapq.heappop(self.pending)[2]
+            if element[2] == ROLLBACK:
+                self.rollback(element[0])
+                continue
+            # blocks are keyed like they are stored, so a block loaded from a
+            # resumed segment is replaced rather than duplicated
+            data = {str(block): blockData for block, blockData in element[1].items()}
+            self.currentData.update(data)
+            self.unsaved.update(data)
+            self.updateView(data)
+            self.latest = max(element[2], self.latest)
             self.logInfo(
-                f"pending merged to current data {self.pending[0][0]} to {self.pending[0][2]}, latest stored: {self.latest}"
+                f"pending merged to current data {element[0]} to {element[2]}, latest stored: {self.latest}"
             )
-            numBlocks += self.pending[0][2] - self.pending[0][0]
-            self.pending.pop(0)
+            numBlocks += element[2] - element[0]
+            if len(element) > 3:
+                self.pendingBytes -= element[3]
         self.logInfo(f"waiting for: {self.latest}")
         return numBlocks
 
+    # drops every block from block onwards after a reorg, only the segment
+    # still in memory can be rolled back
+    def rollback(self, block):
+        if block < self.start:
+            self.logWarn(
+                f"reorg at {block} reaches before the current segment {self.start}",
+                True,
+                False,
+            )
+        for key in [key for key in self.currentData if int(key) >= block]:
+            del self.currentData[key]
+            self.unsaved.pop(key, None)
+            self.removed.add(key)
+        self.latest = max(min(self.latest, block), self.start)
+        if self.latestView is not None:
+            # finished segments keep their blocks, so the view only drops what
+            # was removed to stay in line with storage
+            viewBlock = max(block, self.start)
+            stale = self.latestView.rollback(viewBlock)
+            if stale:
+                self.latestView.update(self.latestBefore(viewBlock, stale))
+        self.logInfo(f"rolled back to {block}, latest stored: {self.latest}")
+
+    # events of the current segment before block, newest block first
+    def currentEventsBefore(self, block, addresses=None, events=None):
+        blocks = sorted(
+            ((int(key), blockData) for key, blockData in self.currentData.items()),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        for key, blockData in blocks:
+            if key < block:
+                yield from iterBlockEvents(key, blockData, addresses, events)
+
+    # the latest events of (address, event) pairs before block. segments are
+    # walked back from block and the walk stops once every pair was found
+    def latestBefore(self, block, keys):
+        remaining = {(address.lower(), event) for address, event in keys}
+        addresses = {address for address, event in remaining}
+        events = {event for address, event in remaining}
+        sources = [self.currentEventsBefore(block, addresses, events)] + [
+            self.iterEvents(file[0], min(file[1], block - 1), addresses, events)
+            for file in reversed(self.getFiles())
+            if file[0] < block and file != self.currentFile
+        ]
+        found = []
+        for source in sources:
+            if not remaining:
+                break
+            seen = set()
+            for event in source:
+                key = (event[2].lower(), event[3])
+                if key in remaining:
+                    found.append(event)
+                    seen.add(key)
+            remaining -= seen
+        return found
+
+    # only when LATESTVIEW is set. blocks stored after the view was last saved
+    # are replayed from the segments
+    def loadView(self):
+        if self.latestView is None and self.viewPath is not None:
+            view = LatestView(self.viewPath)
+            end = max((file[1] for file in self.getFiles()), default=0)
+            if view.validAt < end:
+                self.logInfo(
+                    f"replaying latest view from {view.validAt} to {end}", True
+                )
+                view.update(self.iterEvents(view.validAt, end))
+            self.latestView = view
+        return self.latestView
+
+    def updateView(self, data):
+        if self.latestView is not None:
+            self.latestView.update(
+                event
+                for block, blockData in data.items()
+                for event in iterBlockEvents(int(block), blockData)
+            )
+
+    def saveView(self):
+        if self.latestView is not None:
+            self.latestView.save(self.latest)
+
+    # (block, logIndex, txHash, args) of the last event of a contract, None
+    # when it wasn't seen or the view is disabled
+    def getLatest(self, address, event):
+        view = self.loadView()
+        return None if view is None else view.get(address, event)
+
     def addToPending(self, element):
-        position = 0
-        while position < len(self.pending) and self.pending[position][0] < element[0]:
-            position += 1
-        self.pending.insert(position, element)
+        if element[2] == ROLLBACK:
+            self.dropPending(element[0])
+        heapq.heappush(self.pending, (element[0], next(self.pendingCount), element))
+        if len(element) > 3:
+            self.pendingBytes += element[3]
         self.logInfo(f"data added to pending {element[0]} to {element[2]}")
 
-    def getFiles(self):
+    # results buffered from before a reorg would be merged after its rollback
+    # marker and bring the orphaned blocks back, so they are dropped here
+    def dropPending(self, fork):
+        kept = []
+        for item in self.pending:
+            element = item[2]
+            if element[0] >= fork and element[2] != ROLLBACK:
+                if len(element) > 3:
+                    self.pendingBytes -= element[3]
+                self.logInfo(
+                    f"dropped pending {element[0]} to {element[2]} after reorg"
+                )
+                continue
+            kept.append(item)
+        heapq.heapify(kept)
+        self.pending = kept
+
+    # while too much is buffered behind a missing chunk, only ranges before the
+    # first buffered chunk should be handed out, -1 when there is no limit
+    def getScanLimit(self):
+        if self.pendingBytes > self.maxPendingBytes and self.pending:
+            self.logInfo(
+                f"{self.pendingBytes} bytes pending, holding jobs until {self.latest} to {self.pending[0][0]} arrives"
+            )
+            return self.pending[0][0]
+        return -1
+
+    def listSegments(self, extension):
         all_files = os.listdir(self.filePath)
-        json_files = [
+        segments = [
             (int(start), int(end))
             for file in all_files
-            if file.endswith(".json")
+            if file.endswith("." + extension)
             for start, end in [file.rsplit(".", 2)[:2]]
         ]
-        return sorted(json_files, key=lambda x: x[0])
+        return sorted(segments, key=lambda x: x[0])
+
+    def scanSegments(self):
+        segments = dict(self.listSegments(self.extension))
+        for start, end in self.listSegments("wal"):
+            segments[start] = max(end, segments.get(start, end))
+        return sorted(segments.items(), key=lambda x: x[0])
 
+    def getFiles(self):
+        return list(self.segments)
+
+    # last segment of the contiguous run covering startBlock
     def getLatestFileFrom(self, startBlock):
-        fileTuples = self.getFiles()
-        fileEnd = startBlock
-        started = False
-        for i, fileTuple in enumerate(fileTuples):
-            if fileEnd == startBlock and startBlock >= fileTuple[0]:
-                fileEnd = fileTuple[1]
-            if fileEnd != startBlock:
-                if i + 1 == len(fileTuples):
-                    if startBlock > fileTuple[1]:
-                        return None
-                    return fileTuple
-                if started and fileEnd != fileTuples[i + 1][0]:
-                    return fileTuples[i + 1]
-        return None
+        i = bisect.bisect_right(self.starts, startBlock) - 1
+        if i < 0 or self.segments[i][1] < startBlock:
+            return None
+        while (
+            i + 1 < len(self.segments)
+            and self.segments[i + 1][0] == self.segments[i][1]
+        ):
+            i += 1
+        return self.segments[i]
 
     def toFileName(self, value):
-        return f"{value[0]}.{value[1]}.json"
+        return f"{value[0]}.{value[1]}.{self.extension}"
+
+    def toLogName(self, value):
+        return f"{value[0]}.{value[1]}.wal"
+
+    def writeFile(self, file, data, indent=None):
+        text, offsets = encodeSegment(data, indent)
+        with open(self.filePath + file, "w") as f:
+            f.write(text)
+        return offsets
 
     def loadFile(self, file):
         with open(f"{self.filePath}{file}") as f:
             return json.load(f)
 
+    def loadRange(self, file, start, end):
+        data = self.loadFile(file)
+        return {k: v for k, v in data.items() if start <= int(k) <= end}
+
     def setup(self, startBlock):
-        self.logInfo(f"setting up new scan")
+        self.logInfo("setting up new scan")
         if self.currentFile != None:
-            self.save(indent=4)
+            self.compact(indent=4)
         latestFileTuple = self.getLatestFileFrom(startBlock)
         if latestFileTuple is None:
             self.createNewFile(startBlock)
-            self.latest = startBlock
-            self.start = startBlock
-            self.currentFile = (self.start, self.latest)
         else:
-            self.start = latestFileTuple[0]
+            self.createNewFile(latestFileTuple[0])
             self.latest = latestFileTuple[1]
             self.currentFile = (self.start, self.latest)
-            self.loadFile(self.currentFileName)
+            self.baseFile = self.currentFileName
+            self.currentData = self.loadFile(self.baseFile)
+        self.loadView()
         self.logDebug(f"setup complete, {self.currentFile} waiting for {self.latest}")
 
         return self.latest
 
     def checkMissing(self, start, end):
-        files = self.getFiles()
+        files = self.filesFrom(start)
         missing = []
         i = 0
         while start < end and i < len(files):
             if files[i][0] > start:
-                missing.append((start, files[i][0]))
+                missing.append((start, min(files[i][0], end)))
             start = max(files[i][1], start)
             i += 1
         if start < end:
@@ -153,20 +609,70 @@ class FileHandler(Logger):
         return missing
 
     def getEvents(self, start, end, results):
-        files = self.getFiles()
-        foundStart = False
-        for file in files:
+        for file in self.filesFrom(start):
             if file[1] < start:
                 continue
-            data = self.loadFile(self.toFileName(file))
-            # Filter the first matching file
-            if not foundStart:
-                data = {k: v for k, v in data.items() if int(k) >= start}
-                foundStart = True
-            # Filter the last matching file
+            if file == self.currentFile:
+                data = self.currentData
+                data = {str(k): v for k, v in data.items() if start <= int(k) <= end}
+            else:
+                data = self.loadRange(self.toFileName(file), start, end)
+            results.append(data)
             if file[1] > end:
-                data = {k: v for k, v in data.items() if int(k) <= end}
-                results.append(data)
                 break
-            results.append(data)
         return results
+
+    def iterBlocks(self, file, start, end):
+        return iterJsonItems(self.filePath + file)
+
+    # streams (block, txHash, address, event, logIndex, args) in block order,
+    # holding at most one segment in memory. filtered reads of finished
+    # segments only decode the blocks their index lists
+    def iterEvents(self, start, end, addresses=None, events=None):
+        if addresses is not None:
+            addresses = {address.lower() for address in addresses}
+        if events is not None:
+            events = set(events)
+        for file in self.filesFrom(start):
+            if file[1] < start:
+                continue
+            if file[0] > end:
+                break
+            fileName = self.toFileName(file)
+            index = None
+            if file != self.currentFile and (
+                addresses is not None or events is not None
+            ):
+                index = self.loadIndex(fileName)
+            if file == self.currentFile:
+                blocks = list(self.currentData.items())
+            elif index is not None:
+                blocks = self.readBlocks(
+                    fileName,
+                    index,
+                    indexedBlocks(index, start, end, addresses, events),
+                )
+            else:
+                blocks = self.iterBlocks(fileName, start, end)
+            for block, blockData in blocks:
+                block = int(block)
+                if block < start:
+                    continue
+                if block > end:
+                    break
+                yield from iterBlockEvents(block, blockData, addresses, events)
+
+
+def getFileHandler(settings=None, path=None):
+    if settings is None:
+        settings, path = fileSettings, configPath
+    storage = settings.get("STORAGE", "JSON")
+    if storage == "NPZ":
+        from columnarFileHandler import ColumnarFileHandler
+
+        return ColumnarFileHandler(settings, path)
+    elif storage == "SQLITE":
+        from sqliteFileHandler import SqliteFileHandler
+
+        return SqliteFileHandler(settings, path)
+    return FileHandler(settings, path)
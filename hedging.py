@@ -0,0 +1,97 @@
+import asyncio
+import time
+from collections import deque
+from web3 import AsyncWeb3
+from web3.providers import AsyncHTTPProvider
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def getHedgeW3(apiUrl):
+    provider = AsyncHTTPProvider(apiUrl)
+    provider.middlewares.clear()
+    return AsyncWeb3(provider)
+
+
+# sends a live getLogs to the primary endpoint and, if it is slower than the
+# recent latency percentile, sends the same request to the next backup. the
+# first good response wins and the other request is cancelled. the caller
+# charges the primary, a backup is charged to the shared limiter of the
+# endpoint configured with its url, limiters are keyed by url or RATEKEY
+class Hedger:
+    def __init__(self, primaryUrl, hedgeSettings, limiters=None):
+        self.loop = asyncio.new_event_loop()
+        self.endpoints = [getHedgeW3(primaryUrl)] + [
+            getHedgeW3(url) for url in hedgeSettings["APIURLS"]
+        ]
+        limiters = limiters or {}
+        self.limiters = [None] + [limiters.get(url) for url in hedgeSettings["APIURLS"]]
+        self.percentile = hedgeSettings.get("PERCENTILE", 95)
+        self.minSamples = hedgeSettings.get("MINSAMPLES", 20)
+        # used until enough latencies have been seen
+        self.defaultDelay = hedgeSettings.get("DELAY", 0.5)
+        self.latencies = deque(maxlen=hedgeSettings.get("WINDOW", 200))
+        self.backup = 0
+        self.hedged = 0
+        self.hedgeWins = 0
+
+    def deadline(self):
+        if len(self.latencies) < self.minSamples:
+            return self.defaultDelay
+        return percentile(self.latencies, self.percentile)
+
+    def getLogs(self, filterParams):
+        return self.loop.run_until_complete(self.hedgedGetLogs(filterParams))
+
+    # the logs and the request's own latency
+    async def timedGetLogs(self, w3, filterParams, limiter=None):
+        if limiter is not None:
+            await limiter.acquireAsync("eth_getLogs")
+        startTime = time.time()
+        logs = await w3.eth.get_logs(filterParams)
+        return logs, time.time() - startTime
+
+    async def hedgedGetLogs(self, filterParams):
+        primary = self.loop.create_task(
+            self.timedGetLogs(self.endpoints[0], filterParams)
+        )
+        done, pending = await asyncio.wait({primary}, timeout=self.deadline())
+        if len(self.endpoints) == 1 or (
+            primary in done and primary.exception() is None
+        ):
+            logs, latency = await primary
+            self.latencies.append(latency)
+            return logs
+        # slow or failed, backups take turns so one slow backup doesn't take
+        # every hedge
+        self.hedged += 1
+        self.backup = self.backup % (len(self.endpoints) - 1) + 1
+        backup = self.endpoints[self.backup]
+        pending.add(
+            self.loop.create_task(
+                self.timedGetLogs(backup, filterParams, self.limiters[self.backup])
+            )
+        )
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedgeWins += 1
+                        # the winner's own latency, time to the first answer
+                        # would never be below the deadline
+                        logs, latency = task.result()
+                        self.latencies.append(latency)
+                        return logs
+            # every request failed, surface the primary's error
+            return primary.result()[0]
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
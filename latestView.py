@@ -0,0 +1,52 @@
+import json
+import os
+
+
+def viewKey(address, event):
+    return f"{address.lower()} {event}"
+
+
+# most recent event per (address, event name), kept up to date as blocks are
+# merged and saved with the block it is valid at so a restart only replays
+# what was stored after that
+class LatestView:
+    def __init__(self, path):
+        self.path = path
+        self.validAt = 0
+        self.latest = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.validAt = state["validAt"]
+        self.latest = state["latest"]
+
+    def save(self, validAt):
+        self.validAt = validAt
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"validAt": validAt, "latest": self.latest}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    # takes (block, txHash, address, event, logIndex, args) in any order
+    def update(self, events):
+        for block, txHash, address, event, logIndex, args in events:
+            key = viewKey(address, event)
+            current = self.latest.get(key)
+            if current is None or (current[0], current[1]) < (block, logIndex):
+                self.latest[key] = [block, logIndex, txHash, args]
+
+    def get(self, address, event):
+        return self.latest.get(viewKey(address, event))
+
+    # drops the keys last set at or after block, returns the (address, event)
+    # pairs whose earlier values have to be looked up again
+    def rollback(self, block):
+        stale = [key for key, value in self.latest.items() if value[0] >= block]
+        for key in stale:
+            del self.latest[key]
+        self.validAt = min(self.validAt, block)
+        return [tuple(key.split(" ", 1)) for key in stale]
@@ -0,0 +1,123 @@
+import asyncio
+import itertools
+import orjson
+import websockets
+from eventDecoder import fromRawLog
+from rawTransport import toRawFilter, unpackResponse
+from reorgTracker import ROLLBACK
+from scannerRpcInterface import IJobManager, IliveScan
+
+
+# live mode over eth_subscribe("logs"): logs are pushed to the coordinator as
+# the node announces them. after every (re)connect the blocks since the last
+# delivered log are backfilled with eth_getLogs over the same socket
+class LogSubscriber:
+    def __init__(self, rpc):
+        self.rpc = rpc
+        self.ids = itertools.count(1)
+        self.subscription = None
+        # notifications that arrived while waiting for a call's response
+        self.notifications = []
+        self.last = IliveScan.last
+
+    def run(self):
+        asyncio.run(self.subscribe())
+
+    async def call(self, ws, method, params):
+        requestId = next(self.ids)
+        if self.rpc.limiter is not None:
+            await self.rpc.limiter.acquireAsync(method)
+        await ws.send(
+            orjson.dumps(
+                {"jsonrpc": "2.0", "id": requestId, "method": method, "params": params}
+            ).decode()
+        )
+        while True:
+            message = orjson.loads(await ws.recv())
+            if message.get("id") == requestId:
+                return unpackResponse(message)
+            self.notifications.append(message)
+
+    async def subscribe(self):
+        while IJobManager.state == 2 and self.rpc.running:
+            try:
+                async with websockets.connect(self.rpc.apiUrl, max_size=None) as ws:
+                    rawFilter = toRawFilter(self.rpc.getFilter(0, 0))
+                    del rawFilter["fromBlock"], rawFilter["toBlock"]
+                    self.subscription = await self.call(
+                        ws, "eth_subscribe", ["logs", rawFilter]
+                    )
+                    self.rpc.logInfo(f"subscribed to logs from {self.last}")
+                    await self.backfill(ws)
+                    await self.listen(ws)
+            # json-rpc errors surface as ValueError, the node may also refuse
+            # the subscription itself
+            except (
+                websockets.exceptions.ConnectionClosed,
+                OSError,
+                asyncio.TimeoutError,
+                ValueError,
+            ) as e:
+                self.rpc.logWarn(
+                    f"subscription lost ({type(e)}, {e}), resubscribing from {self.last}",
+                    True,
+                )
+                await asyncio.sleep(self.rpc.pollInterval)
+
+    # the subscription only carries logs from after it was opened
+    async def backfill(self, ws):
+        head = int(await self.call(ws, "eth_blockNumber", []), 16)
+        start = self.last
+        size = self.rpc.chunkSizeFor(start)
+        while start <= head:
+            end = min(start + size, head)
+            filterParams = toRawFilter(self.rpc.getFilter(start, end))
+            try:
+                logs = await self.call(ws, "eth_getLogs", [filterParams])
+            except ValueError as e:
+                error = e.args[0] if e.args and isinstance(e.args[0], dict) else {}
+                if "rate limit" in str(error.get("message", "")):
+                    if self.rpc.limiter is not None:
+                        self.rpc.limiter.backOff()
+                    await asyncio.sleep(self.rpc.pollInterval)
+                    continue
+                # after a long disconnect the range may be too wide or too full
+                # for one request, it is retried in halves
+                if end == start:
+                    raise
+                self.rpc.logInfo(f"backfill {start}-{end} failed ({e}), splitting")
+                size = (end - start) // 2
+                continue
+            self.deliver([fromRawLog(log) for log in logs])
+            start = end + 1
+        self.last = max(self.last, head)
+
+    async def listen(self, ws):
+        while IJobManager.state == 2 and self.rpc.running:
+            messages, self.notifications = self.notifications, []
+            try:
+                messages.append(
+                    orjson.loads(
+                        await asyncio.wait_for(ws.recv(), self.rpc.pollInterval)
+                    )
+                )
+            except asyncio.TimeoutError:
+                IJobManager.checkJob(self.rpc)
+            logs = [
+                fromRawLog(message["params"]["result"])
+                for message in messages
+                if message.get("method") == "eth_subscription"
+                and message["params"]["subscription"] == self.subscription
+            ]
+            self.deliver(logs)
+
+    def deliver(self, logs):
+        removed = [log["blockNumber"] for log in logs if log["removed"]]
+        if removed:
+            self.rpc.logWarn(f"reorg, logs removed from {min(removed)}", True)
+            IliveScan.addResults([min(removed), {}, ROLLBACK])
+            logs = [log for log in logs if not log["removed"]]
+        if logs:
+            self.rpc.logInfo(f"updating results with {len(logs)} events")
+            IliveScan.addResults([self.last, self.rpc.decodeEvents(logs), -1])
+            self.last = max(self.last, max(log["blockNumber"] for log in logs))
@@ -0,0 +1,40 @@
+from eth_utils import keccak
+from eventDecoder import toBytes
+
+
+# the three of 2048 bits a value sets in a block's logsBloom, taken from the
+# first six bytes of its keccak hash
+def bloomMask(value):
+    digest = keccak(toBytes(value))
+    mask = 0
+    for i in (0, 2, 4):
+        mask |= 1 << (((digest[i] << 8) | digest[i + 1]) & 2047)
+    return mask
+
+
+def toBloomInt(bloom):
+    return int.from_bytes(toBytes(bloom), "big")
+
+
+# tests block blooms against a getLogs filter, a block can only hold a
+# matching log if one of the addresses and one of the topic0s are in its bloom
+class LogsBloom:
+    def __init__(self, filterParams):
+        addresses = filterParams.get("address") or []
+        topics = filterParams.get("topics") or []
+        topic0s = topics[0] if topics and topics[0] else []
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        if isinstance(topic0s, (str, bytes)):
+            topic0s = [topic0s]
+        self.addressMasks = [bloomMask(address) for address in addresses]
+        self.topicMasks = [bloomMask(topic0) for topic0 in topic0s]
+
+    def anyIn(self, bloom, masks):
+        return not masks or any(bloom & mask == mask for mask in masks)
+
+    def mayMatch(self, bloom):
+        bloom = toBloomInt(bloom)
+        return self.anyIn(bloom, self.addressMasks) and self.anyIn(
+            bloom, self.topicMasks
+        )
@@ -0,0 +1,73 @@
+import multiprocessing
+
+
+# fixed size ring buffer of [start, end) block ranges kept in shared memory,
+# every operation takes the lock once and never talks to a manager process.
+# a range may carry a planned job size that overrides the size workers ask for
+# and the endpoint that last failed it, which is skipped while others can serve
+class RangeAllocator:
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._ranges = multiprocessing.RawArray("q", capacity * 4)
+        self._head = multiprocessing.RawValue("q", 0)
+        self._count = multiprocessing.RawValue("q", 0)
+        # no range starting at or beyond the limit is handed out, -1 for none
+        self._limit = multiprocessing.RawValue("q", -1)
+        self._lock = multiprocessing.Lock()
+
+    def _slot(self, i):
+        return ((self._head.value + i) % self.capacity) * 4
+
+    def addRange(self, start, end, jobSize=0, avoid=-1):
+        with self._lock:
+            if self._count.value > 0:
+                front = self._slot(0)
+                if (
+                    self._ranges[front] == end
+                    and self._ranges[front + 2] == jobSize
+                    and self._ranges[front + 3] == avoid
+                ):
+                    self._ranges[front] = start
+                    return
+            if self._count.value == self.capacity:
+                raise OverflowError(f"range table full ({self.capacity} ranges)")
+            self._head.value = (self._head.value - 1) % self.capacity
+            self._count.value += 1
+            front = self._slot(0)
+            self._ranges[front] = start
+            self._ranges[front + 1] = end
+            self._ranges[front + 2] = jobSize
+            self._ranges[front + 3] = avoid
+
+    def setLimit(self, limit):
+        self._limit.value = limit
+
+    def getJob(self, maxSize, endpoint=-1, avoid=False):
+        with self._lock:
+            while self._count.value > 0:
+                front = self._slot(0)
+                if self._ranges[front] < self._ranges[front + 1]:
+                    break
+                self._head.value = (self._head.value + 1) % self.capacity
+                self._count.value -= 1
+            for i in range(self._count.value):
+                slot = self._slot(i)
+                start = self._ranges[slot]
+                end = self._ranges[slot + 1]
+                if start >= end or (avoid and self._ranges[slot + 3] == endpoint):
+                    continue
+                break
+            else:
+                return []
+            jobEnd = min(start + (self._ranges[slot + 2] or maxSize), end)
+            limit = self._limit.value
+            if limit >= 0:
+                if start >= limit:
+                    return []
+                jobEnd = min(jobEnd, limit)
+            self._ranges[slot] = jobEnd
+            return (start, jobEnd, self._ranges[slot + 2])
+
+    def __len__(self):
+        with self._lock:
+            return self._count.value
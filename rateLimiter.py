@@ -0,0 +1,111 @@
+import asyncio
+import multiprocessing
+import time
+
+# compute units per call, roughly what alchemy and similar providers charge
+COMPUTEUNITS = {
+    "eth_getLogs": 75,
+    "eth_blockNumber": 10,
+    "eth_getBlockByNumber": 16,
+    "eth_getFilterChanges": 20,
+    "eth_subscribe": 10,
+}
+DEFAULTUNITS = 20
+# a rate limit response cuts the shared rate by this factor and then drains
+# one second of tokens so every process sharing the bucket pauses together
+BACKOFF = 0.9
+RECOVERY = 0.01
+
+
+# token bucket in shared memory, refilled continuously at the current rate
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.maxRate = rate
+        self.burst = burst or rate
+        self._rate = multiprocessing.RawValue("d", rate)
+        self._tokens = multiprocessing.RawValue("d", self.burst)
+        self._updated = multiprocessing.RawValue("d", time.time())
+        self._lock = multiprocessing.Lock()
+
+    def refill(self, now):
+        elapsed = now - self._updated.value
+        self._updated.value = now
+        self._tokens.value = min(
+            self.burst, self._tokens.value + elapsed * self._rate.value
+        )
+
+    # takes the tokens now and returns how long to wait before using them
+    def reserve(self, amount):
+        with self._lock:
+            self.refill(time.time())
+            self._tokens.value -= amount
+            if self._tokens.value >= 0:
+                # creep back towards the configured rate after a backoff
+                self._rate.value = min(
+                    self.maxRate, self._rate.value + self.maxRate * RECOVERY
+                )
+                return 0
+            return -self._tokens.value / self._rate.value
+
+    def backOff(self):
+        with self._lock:
+            self.refill(time.time())
+            self._rate.value = max(self.maxRate * 0.1, self._rate.value * BACKOFF)
+            self._tokens.value = min(self._tokens.value, 0) - self._rate.value
+
+    @property
+    def rate(self):
+        return self._rate.value
+
+
+# requests per second and compute units per second for one provider key,
+# shared by every rpc process that uses it
+class RateLimiter:
+    def __init__(self, settings):
+        self.buckets = []
+        self.requestBucket = None
+        self.unitBucket = None
+        self.computeUnits = dict(COMPUTEUNITS, **settings.get("COMPUTEUNITS", {}))
+        if settings.get("RPS"):
+            self.requestBucket = TokenBucket(settings["RPS"])
+            self.buckets.append(self.requestBucket)
+        if settings.get("CUPS"):
+            self.unitBucket = TokenBucket(settings["CUPS"])
+            self.buckets.append(self.unitBucket)
+
+    def reserve(self, method, count=1):
+        wait = 0
+        if self.requestBucket is not None:
+            wait = max(wait, self.requestBucket.reserve(count))
+        if self.unitBucket is not None:
+            units = self.computeUnits.get(method, DEFAULTUNITS) * count
+            wait = max(wait, self.unitBucket.reserve(units))
+        return wait
+
+    def acquire(self, method, count=1):
+        wait = self.reserve(method, count)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquireAsync(self, method, count=1):
+        wait = self.reserve(method, count)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def backOff(self):
+        for bucket in self.buckets:
+            bucket.backOff()
+
+
+def rateKey(settings):
+    return settings.get("RATEKEY") or str(settings["APIURL"])
+
+
+# one limiter per provider key, endpoints without RPS or CUPS get none
+def getRateLimiters(settingsList):
+    limiters = {}
+    for settings in settingsList:
+        key = rateKey(settings)
+        if key not in limiters and (settings.get("RPS") or settings.get("CUPS")):
+            limiters[key] = RateLimiter(settings)
+    return limiters
@@ -0,0 +1,122 @@
+import itertools
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from eventDecoder import fromRawLog
+
+
+def toRawFilter(filterParams):
+    rawFilter = {}
+    for key in ("fromBlock", "toBlock"):
+        value = filterParams[key]
+        rawFilter[key] = hex(value) if isinstance(value, int) else value
+    if filterParams.get("address"):
+        rawFilter["address"] = filterParams["address"]
+    if filterParams.get("topics"):
+        rawFilter["topics"] = filterParams["topics"]
+    return rawFilter
+
+
+def unpackResponse(response):
+    if "error" in response:
+        # same shape web3 raises so RPC.handleError can read the message
+        raise ValueError(response["error"])
+    return response["result"]
+
+
+# posts json-rpc straight to the node and hands the parsed result back without
+# going through web3's request and result formatters
+class RawTransport:
+    def __init__(self, w3, timeout=30, poolSize=4):
+        self.ids = itertools.count()
+        # size of the last http response body, None over websocket and ipc
+        self.lastBytes = None
+        self.timeout = timeout
+        if isinstance(w3.provider, Web3.HTTPProvider):
+            self.url = w3.provider.endpoint_uri
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self.session.headers.update({"Content-Type": "application/json"})
+            self.provider = None
+        else:
+            # websocket and ipc providers already return the raw response
+            self.session = None
+            self.provider = w3.provider
+
+    def post(self, payload):
+        response = self.session.post(
+            self.url, data=orjson.dumps(payload), timeout=self.timeout
+        )
+        response.raise_for_status()
+        self.lastBytes = len(response.content)
+        return orjson.loads(response.content)
+
+    def toPayload(self, method, params):
+        return {
+            "jsonrpc": "2.0",
+            "id": next(self.ids),
+            "method": method,
+            "params": params,
+        }
+
+    def request(self, method, params):
+        if self.session is not None:
+            response = self.post(self.toPayload(method, params))
+        else:
+            response = self.provider.make_request(method, params)
+        return unpackResponse(response)
+
+    # sends [(method, params)] as one json-rpc batch, returns the results in
+    # the same order with failed elements as ValueError instead of raising
+    def batch(self, calls):
+        if self.session is None:
+            # websocket and ipc providers have no batch support in web3 6
+            responses = [self.provider.make_request(*call) for call in calls]
+        else:
+            payloads = [self.toPayload(method, params) for method, params in calls]
+            body = self.post(payloads)
+            if isinstance(body, dict):
+                # the node rejected the whole batch
+                unpackResponse(body)
+            byId = {response.get("id"): response for response in body}
+            responses = [
+                byId.get(
+                    payload["id"],
+                    {"error": {"code": -32603, "message": "missing batch response"}},
+                )
+                for payload in payloads
+            ]
+        results = []
+        for response in responses:
+            try:
+                results.append(unpackResponse(response))
+            except ValueError as e:
+                results.append(e)
+        return results
+
+    def getRawLogs(self, filterParams):
+        return self.request("eth_getLogs", [toRawFilter(filterParams)])
+
+    def getLogs(self, filterParams):
+        return [fromRawLog(log) for log in self.getRawLogs(filterParams)]
+
+    # eth_getLogs for every filter plus eth_blockNumber in one round trip,
+    # returns ([logs or ValueError per filter], block number or ValueError)
+    def getLogsBatch(self, filters, normalize=True):
+        calls = [("eth_getLogs", [toRawFilter(f)]) for f in filters]
+        results = self.batch(calls + [("eth_blockNumber", [])])
+        blockNumber = results.pop()
+        if not isinstance(blockNumber, Exception):
+            blockNumber = int(blockNumber, 16)
+        if normalize:
+            results = [
+                r if isinstance(r, Exception) else [fromRawLog(log) for log in r]
+                for r in results
+            ]
+        return results, blockNumber
+
+    def getBlockNumber(self):
+        return int(self.request("eth_blockNumber", []), 16)
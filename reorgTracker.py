@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+# end block of a live result telling the coordinator to drop every block from
+# its start onwards
+ROLLBACK = -2
+
+
+def toHash(value):
+    if isinstance(value, str):
+        return value[2:].lower() if value.startswith("0x") else value.lower()
+    return bytes(value).hex()
+
+
+# rolling window of recent block hashes, each new header is checked against
+# the hash recorded for its parent so a reorg is caught on the first block
+# built on the new fork
+class ReorgTracker:
+    def __init__(self, depth=64):
+        self.depth = depth
+        self.hashes = OrderedDict()
+
+    @property
+    def head(self):
+        return next(reversed(self.hashes)) if self.hashes else None
+
+    # headers are (number, hash, parentHash) in ascending order, returns the
+    # first block that has to be dropped or None when the chain is intact
+    def addHeaders(self, headers, getHeader):
+        for number, blockHash, parentHash in headers:
+            known = self.hashes.get(number - 1)
+            if known is not None and known != toHash(parentHash):
+                return self.findFork(number - 1, getHeader)
+            self.hashes[number] = toHash(blockHash)
+        while len(self.hashes) > self.depth:
+            self.hashes.popitem(last=False)
+        return None
+
+    # a log whose block hash differs from the recorded header came from the
+    # other side of a reorg
+    def checkLogs(self, logs):
+        fork = None
+        for log in logs:
+            known = self.hashes.get(log["blockNumber"])
+            if known is not None and known != toHash(log["blockHash"]):
+                block = log["blockNumber"]
+                fork = block if fork is None else min(fork, block)
+        return fork
+
+    # walks back until the recorded hash matches the chain again, everything
+    # after the common ancestor is forgotten. a block the node no longer has
+    # counts as a mismatch
+    def findFork(self, block, getHeader):
+        while block in self.hashes:
+            header = getHeader(block)
+            if header is not None and self.hashes[block] == toHash(header[1]):
+                break
+            block -= 1
+        fork = block + 1
+        self.rewind(fork)
+        return fork
+
+    def rewind(self, fork):
+        for number in [n for n in self.hashes if n >= fork]:
+            del self.hashes[number]
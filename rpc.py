@@ -1,14 +1,25 @@
-from web3._utils.events import get_event_data
 import sys
 from web3 import Web3
+from web3.exceptions import BlockNotFound
 import time
 import re
 from logger import Logger
 import math
 import asyncio
 import traceback
+import requests
+import aiohttp
 from hardhat import runHardhat
 from scannerRpcInterface import IfixedScan, IJobManager, IliveScan
+from eventDecoder import compileDecoders, decodeLogs, fromRawLog
+from rawTransport import RawTransport
+from chunkController import ChunkController
+from hedging import Hedger
+from chunkCache import ChunkCache
+from logsBloom import LogsBloom
+from reorgTracker import ROLLBACK, ReorgTracker
+from logSubscriber import LogSubscriber
+from configLoader import configPath
 from collections import deque
 
 
@@ -31,58 +42,18 @@ def getW3(cfg):
     return w3, webSocket
 
 
-def getEventData(self, events):
-    decodedEvents = {}
-    for param in events:
-        blockNumber, txHash, address, index = getEventParameters(param)
-        if blockNumber not in decodedEvents:
-            decodedEvents[blockNumber] = {}
-        if txHash not in decodedEvents[blockNumber]:
-            decodedEvents[blockNumber][txHash] = {}
-        if address not in decodedEvents[blockNumber][txHash]:
-            decodedEvents[blockNumber][txHash][address] = {}
-        decodedEvents[blockNumber][txHash][address][index] = {}
-        for eventName, eventParam in param["args"].items():
-            decodedEvents[blockNumber][txHash][address][index][eventName] = eventParam
-    return decodedEvents
-
-
-def decodeEvents(self, events):
-    decodedEvents = {}
-    for param in events:
-        blockNumber, txHash, address, index = getEventParameters(param)
-        if blockNumber not in self.log:
-            self.log[blockNumber] = {}
-        if txHash not in self.log[blockNumber]:
-            self.log[blockNumber][txHash] = {}
-        if address not in decodedEvents:
-            decodedEvents[address] = {}
-        if address not in self.log[blockNumber][txHash]:
-            self.log[blockNumber][txHash][address] = {}
-        self.log[blockNumber][txHash][address][index] = {}
-        decodedEvents[address][index] = {}
-        for eventName, eventParam in param["args"].items():
-            decodedEvents[address][index][eventName] = eventParam
-            self.log[blockNumber][txHash][address][index][eventName] = eventParam
-    return decodedEvents
-
-
-def getEventParameters(param):
-    if "event" in param:
-        event = str(param["event"]) + " " + str(param["logIndex"])
-    else:
-        event = "unkown " + str(param["logIndex"])
-
-    return (
-        param["blockNumber"],
-        param["transactionHash"].hex(),
-        param["address"],
-        event,
-    )
-
-
 class RPC(Logger):
-    def __init__(self, rpcSettings, scanMode, contracts, abiLookups):
+    def __init__(
+        self,
+        rpcSettings,
+        scanMode,
+        contracts,
+        abiLookups,
+        scheduler=None,
+        endpoint=-1,
+        limiter=None,
+        backupLimiters=None,
+    ):
         self.apiUrl = rpcSettings["APIURL"]
         Logger.setProcessName(rpcSettings["NAME"])
         super().__init__(rpcSettings["DEBUGLEVEL"])
@@ -92,7 +63,10 @@ class RPC(Logger):
         else:
             self.w3, self.websocket = getW3(rpcSettings)
         self.maxChunkSize = rpcSettings["MAXCHUNKSIZE"]
-        self.currentChunkSize = rpcSettings["STARTCHUNKSIZE"]
+        self.controller = ChunkController(
+            rpcSettings, f"{configPath}chunks/{rpcSettings['NAME']}.json"
+        )
+        self.currentChunkSize = self.controller.size
         self.eventsTarget = rpcSettings["EVENTSTARGET"]
         self.pollInterval = rpcSettings["POLLINTERVAL"]
         self.contracts = contracts
@@ -104,8 +78,48 @@ class RPC(Logger):
         self.end = 0
         self.running = True
         self.scanMode = scanMode
+        self.scheduler = scheduler
+        self.endpoint = endpoint
+        self.limiter = limiter
+        self.decoders = compileDecoders(scanMode, contracts, abiLookups, self.w3.codec)
+        self.raw = None
+        self.batchSize = rpcSettings.get("BATCHSIZE", 1) or 1
+        self.bloomFilter = rpcSettings.get("BLOOMFILTER", False) or False
+        self.bloomBatch = rpcSettings.get("BLOOMBATCH", 100) or 100
+        self.bloomGap = rpcSettings.get("BLOOMGAP", 100) or 100
+        self.latestBlock = None
+        self.cache = None
+        if rpcSettings.get("CACHE", False):
+            self.cache = ChunkCache(
+                rpcSettings.get("CACHEDIR") or f"{configPath}../cache/",
+                rpcSettings.get("CACHEBUCKET", 1000) or 1000,
+                rpcSettings.get("FINALITYDEPTH", 1000) or 1000,
+                rpcSettings.get("CACHEMAXBYTES", 1 << 30) or 1 << 30,
+            )
+            self.cacheHeadTime = 0
+        # batches go through the raw transport, web3 6 can't batch requests,
+        # and the cache stores raw responses. the bloom pre-check fetches its
+        # headers in batches too
+        if (
+            rpcSettings.get("RAWTRANSPORT", False)
+            or self.batchSize > 1
+            or self.cache is not None
+            or self.bloomFilter
+        ):
+            self.raw = RawTransport(self.w3)
+        self.subscribe = self.websocket and rpcSettings.get("SUBSCRIBE", False)
+        reorgDepth = rpcSettings.get("REORGDEPTH", 64)
+        self.reorgs = ReorgTracker(reorgDepth) if reorgDepth else None
+        self.hedger = None
+        # hedging only covers live http polls
+        if rpcSettings.get("HEDGE") and isinstance(self.w3.provider, Web3.HTTPProvider):
+            self.hedger = Hedger(
+                self.w3.provider.endpoint_uri, rpcSettings["HEDGE"], backupLimiters
+            )
         self.logDebug(f"logging enabled")
         self.completedJobs = deque(maxlen=20)
+        if self.scheduler is not None:
+            self.scheduler.register(self.endpoint)
 
     def initHREW3(self, HRESettings):
         self.hh = runHardhat(HRESettings)
@@ -131,10 +145,17 @@ class RPC(Logger):
         if self.jobs:
             for job in self.jobs:
                 IfixedScan.addScanRange(job[0], job[1])
+        if self.scheduler is not None:
+            self.scheduler.retire(self.endpoint)
+        self.controller.save()
 
     def runFixed(self):
         while IJobManager.state == 1:
             IJobManager.checkJob(self)
+            benched = self.benchedFor()
+            if benched:
+                time.sleep(min(benched, self.pollInterval))
+                continue
             self.fixedScan()
 
     def checkJobs(self):
@@ -143,9 +164,15 @@ class RPC(Logger):
         except Exception as e:
             print(e)
 
+    # a benched endpoint takes no jobs, the scanner's own rpc is driven from
+    # the result loop so it returns instead of sleeping
     def fixedScan(self):
-        if len(self.jobs) == 0:
-            newJob = IfixedScan.getScanJob(self.currentChunkSize)
+        if self.benchedFor():
+            return
+        if self.useBatch():
+            self.batchScan()
+        elif len(self.jobs) == 0:
+            newJob = self.requestJob()
             if newJob != [] and newJob[0] != newJob[1]:
                 self.jobs.append(newJob)
                 self.logInfo(f"job added: {self.jobs} ")
@@ -153,9 +180,11 @@ class RPC(Logger):
             try:
                 job = self.nextJob()
                 self.logInfo(f"starting job {job}")
-                events = self.scanChunk(job[0], job[1])
+                events, latency = self.scanJob(job[0], job[1])
                 IfixedScan.addResults([job[0], self.decodeEvents(events), job[1]])
-                self.throttle(events, self.jobs[0][1] - self.jobs[0][0])
+                self.throttle(
+                    events, job[0], job[1] - job[0], latency, self.responseBytes()
+                )
                 self.logInfo(
                     f"processed events: {len(events)}, from {self.jobs[0][0]} to {self.jobs[0][1]} ({self.jobs[0][1]-self.jobs[0][0]}), throttled to {self.currentChunkSize}"
                 )
@@ -164,10 +193,67 @@ class RPC(Logger):
             except Exception as e:
                 self.handleError(e)
 
+    # small chunks are sent as one json-rpc batch as long as the whole batch
+    # spans no more blocks than a single max size request
+    def useBatch(self):
+        return (
+            self.batchSize > 1
+            and self.currentChunkSize * self.batchSize <= self.maxChunkSize
+        )
+
+    def batchScan(self):
+        while len(self.jobs) < self.batchSize:
+            newJob = self.requestJob()
+            if newJob == [] or newJob[0] == newJob[1]:
+                break
+            self.jobs.append(newJob)
+        if len(self.jobs) == 0:
+            return
+        batch = []
+        while self.jobs and len(batch) < self.batchSize:
+            self.nextJob()
+            batch.append(self.jobs.pop(0))
+        self.logInfo(f"starting batch {batch}")
+        startTime = time.time()
+        try:
+            results, latest = self.getLogsBatch(
+                [self.getFilter(job[0], job[1]) for job in batch]
+            )
+        except Exception as e:
+            self.jobs[:0] = batch
+            self.handleError(e)
+            return
+        latency = time.time() - startTime
+        if not isinstance(latest, Exception):
+            self.latestBlock = latest
+        retry = []
+        events = []
+        blockRange = 0
+        for job, result in zip(batch, results):
+            if isinstance(result, Exception):
+                failed = [job]
+                self.handleError(result, failed)
+                retry.extend(failed)
+                continue
+            IfixedScan.addResults([job[0], self.decodeEvents(result), job[1]])
+            events.extend(result)
+            blockRange += job[1] - job[0]
+        self.jobs[:0] = retry
+        if blockRange:
+            self.throttle(
+                events, batch[0][0], blockRange, latency, self.responseBytes()
+            )
+            self.failCount = 0
+        self.logInfo(
+            f"processed batch events: {len(events)}, {len(batch) - len(retry)}/{len(batch)} jobs, throttled to {self.currentChunkSize}"
+        )
+
     def runLive(self):
         last = IliveScan.last
         self.logInfo(f"livescan started at block {last}")
-        if self.websocket:
+        if self.subscribe:
+            LogSubscriber(self).run()
+        elif self.websocket:
             self.filterParams = self.getFilter(last, "latest")
             self.filterParams = self.w3.eth.filter(self.filterParams)
             while IJobManager.state == 2:
@@ -176,7 +262,14 @@ class RPC(Logger):
                     IJobManager.checkJob(self)
                     startTime = time.time()
                     self.logInfo("request latest events")
+                    self.acquire("eth_getFilterChanges")
                     newEvents = self.filterParams.get_new_entries()
+                    removed = [e["blockNumber"] for e in newEvents if e.get("removed")]
+                    if removed:
+                        # the node already replays the new fork through the filter
+                        self.logWarn(f"reorg, logs removed from {min(removed)}", True)
+                        IliveScan.addResults([min(removed), {}, ROLLBACK])
+                        newEvents = [e for e in newEvents if not e.get("removed")]
                     if len(newEvents) > 0:
                         self.logInfo(f"updating results with {len(newEvents)} events")
                         IliveScan.addResults([last, self.decodeEvents(newEvents), -1])
@@ -194,9 +287,35 @@ class RPC(Logger):
                     IJobManager.checkJob(self)
                     last = IliveScan.last
                     self.logInfo(f"request new events from {last}")
-                    self.filterParams = self.getFilter(last, last + 5)
+                    end = last + 5
+                    if self.latestBlock is not None:
+                        # catch up to the head seen on the previous poll
+                        end = min(max(end, self.latestBlock), last + self.maxChunkSize)
+                    self.filterParams = self.getFilter(last, end)
                     startTime = time.time()
-                    newEvents = self.w3.eth.get_logs(self.filterParams)
+                    if self.hedger is not None:
+                        self.acquire("eth_getLogs")
+                        newEvents = self.hedger.getLogs(self.filterParams)
+                        self.logDebug(
+                            f"hedge deadline {self.hedger.deadline()}s, hedged {self.hedger.hedged}, won {self.hedger.hedgeWins}"
+                        )
+                    elif self.batchSize > 1:
+                        results, latest = self.getLogsBatch([self.filterParams])
+                        if not isinstance(latest, Exception):
+                            self.latestBlock = latest
+                        newEvents = results[0]
+                        if isinstance(newEvents, Exception):
+                            raise newEvents
+                    else:
+                        newEvents = self.getLogs(self.filterParams)
+                    if self.reorgs is not None:
+                        fork = self.checkReorg(last, end, newEvents)
+                        if fork is not None:
+                            self.logWarn(f"reorg, rolling back from {fork}", True)
+                            IliveScan.addResults([fork, {}, ROLLBACK])
+                            # the next poll rescans from the fork only
+                            IliveScan.last = fork
+                            continue
                     if len(newEvents) > 0:
                         self.logInfo(
                             f"updating results with {len(newEvents)} new events"
@@ -211,44 +330,253 @@ class RPC(Logger):
                         f"error: {type(e)}, {e}, {traceback.format_exc()}", True
                     )
 
+    # headers not seen yet are checked against the hash window, returns the
+    # first block to roll back or None
+    def checkReorg(self, start, end, logs):
+        head = self.reorgs.head
+        first = start if head is None else head + 1
+        numbers = list(range(max(first, end - self.reorgs.depth + 1), end + 1))
+        headers = self.getHeaders(numbers)
+        fork = self.reorgs.addHeaders(headers, self.getHeader)
+        logFork = self.reorgs.checkLogs(logs)
+        if logFork is not None:
+            self.reorgs.rewind(logFork)
+            fork = logFork if fork is None else min(fork, logFork)
+        return fork
+
+    # blocks without transactions up to the first that doesn't exist yet
+    def getBlocks(self, numbers):
+        if self.raw is not None:
+            self.acquire("eth_getBlockByNumber", len(numbers))
+            blocks = self.raw.batch(
+                [("eth_getBlockByNumber", [hex(n), False]) for n in numbers]
+            )
+        else:
+            blocks = []
+            for n in numbers:
+                self.acquire("eth_getBlockByNumber")
+                try:
+                    blocks.append(self.w3.eth.get_block(n))
+                except BlockNotFound:
+                    break
+        found = []
+        for block in blocks:
+            if block is None or isinstance(block, Exception):
+                break
+            found.append(block)
+        return found
+
+    # (number, hash, parentHash) for each block up to the first that doesn't
+    # exist yet
+    def getHeaders(self, numbers):
+        return [
+            (n, block["hash"], block["parentHash"])
+            for n, block in zip(numbers, self.getBlocks(numbers))
+        ]
+
+    # None when the block doesn't exist (anymore)
+    def getHeader(self, number):
+        headers = self.getHeaders([number])
+        return headers[0] if headers else None
+
+    # [start, end) ranges holding every block in [start, end) whose logsBloom
+    # may contain a log of the filter, hits up to gap blocks apart share a range
+    def bloomRanges(self, start, end, batchSize=100, gap=100):
+        bloom = LogsBloom(self.getFilter(start, end))
+        ranges = []
+        for batchStart in range(start, end, batchSize):
+            numbers = list(range(batchStart, min(batchStart + batchSize, end)))
+            blocks = self.getBlocks(numbers)
+            if len(blocks) < len(numbers):
+                raise BlockNotFound(f"block {numbers[len(blocks)]} not available")
+            for n, block in zip(numbers, blocks):
+                if not bloom.mayMatch(block["logsBloom"]):
+                    continue
+                if ranges and n - ranges[-1][1] <= gap:
+                    ranges[-1][1] = n + 1
+                else:
+                    ranges.append([n, n + 1])
+        self.logInfo(f"bloom candidates in {start}-{end}: {len(ranges)} ranges")
+        return [tuple(r) for r in ranges]
+
     def decodeEvents(self, events):
-        decodedEvents = []
-        if self.scanMode == "ANYEVENT":
-            for event in events:
-                evt = get_event_data(
-                    self.w3.codec,
-                    self.contracts[event["address"]][event["topics"][0].hex()],
-                    event,
-                )
-                decodedEvents.append(evt)
-        elif self.scanMode == "ANYCONTRACT":
-            for event in events:
-                eventLookup = self.abiLookups[event["topics"][0].hex()]
-                numTopics = len(event["topics"])
-                if numTopics in eventLookup:
-                    evt = get_event_data(
-                        self.w3.codec,
-                        self.abiLookups[event["topics"][0].hex()][numTopics],
-                        event,
-                    )
-                    decodedEvents.append(evt)
-        return self.getEventData(decodedEvents)
-
-    def nextJob(self):
-        length = self.jobs[0][1] - self.jobs[0][0]
-        if length > self.currentChunkSize + 1:
-            self.logInfo(
-                f"existing job too big, splitting {length}, {self.currentChunkSize}"
+        matched = []
+        for event in events:
+            if self.scanMode == "ANYEVENT":
+                decoder = self.decoders[(event["address"], event["topics"][0])]
+            else:
+                decoder = self.decoders.get((event["topics"][0], len(event["topics"])))
+                if decoder is None:
+                    continue
+            matched.append((event, decoder))
+        decodedEvents = {}
+        for (event, decoder), args in zip(matched, decodeLogs(matched)):
+            txHash = event["transactionHash"]
+            if not isinstance(txHash, str):
+                txHash = txHash.hex()
+            blockEvents = decodedEvents.setdefault(event["blockNumber"], {})
+            txEvents = blockEvents.setdefault(txHash, {})
+            addressEvents = txEvents.setdefault(event["address"], {})
+            addressEvents[f"{decoder.name} {event['logIndex']}"] = args
+        return decodedEvents
+
+    # ranges another endpoint failed are left to it while others are healthy
+    def requestJob(self):
+        avoid = self.scheduler is not None and self.scheduler.othersHealthy(
+            self.endpoint
+        )
+        return IfixedScan.getScanJob(self.currentChunkSize, self.endpoint, avoid)
+
+    def releaseJobs(self, jobs, avoid=-1):
+        for job in reversed(jobs):
+            IfixedScan.addScanRange(
+                job[0], job[1], job[2] if len(job) > 2 else 0, avoid
             )
-            self.splitJob(math.ceil(length / self.currentChunkSize))
-        return self.jobs[0]
+        jobs.clear()
+
+    def chunkSizeFor(self, block):
+        size = self.controller.sizeFor(block)
+        if self.scheduler is not None:
+            size = self.controller.clamp(size * self.scheduler.weight(self.endpoint))
+        return size
+
+    def nextJob(self, jobs=None):
+        if jobs is None:
+            jobs = self.jobs
+        job = jobs[0]
+        self.currentChunkSize = self.chunkSizeFor(job[0])
+        length = job[1] - job[0]
+        # a planned size was already chosen for the range, it only gives way
+        # to the node's range limit
+        limit = self.currentChunkSize
+        planned = len(job) > 2 and job[2] > 0
+        if planned:
+            limit = min(job[2], self.controller.rangeLimit)
+        if length > limit + 1:
+            self.logInfo(f"existing job too big, splitting {length}, {limit}")
+            self.splitJob(math.ceil(length / limit), not planned, jobs=jobs)
+        return jobs[0]
 
     def scanChunk(self, start, end):
         filterParams = self.getFilter(start, end)
-        eventlogs = self.w3.eth.get_logs(filterParams)
+        eventlogs = self.getLogs(filterParams)
         self.logInfo(f"received events: {len(eventlogs)}")
         return eventlogs
 
+    # with BLOOMFILTER only the parts of the job whose block blooms may hold a
+    # matching log are requested, the rest is stored as empty with the job.
+    # returns the events and the time spent on getLogs alone, the header
+    # fetches of the pre-check don't count towards the chunk size
+    def scanJob(self, start, end):
+        ranges = [(start, end + 1)]
+        if self.bloomFilter:
+            ranges = self.bloomRanges(start, end + 1, self.bloomBatch, self.bloomGap)
+        events = []
+        startTime = time.time()
+        for rangeStart, rangeEnd in ranges:
+            events.extend(self.scanChunk(rangeStart, rangeEnd - 1))
+        return events, time.time() - startTime
+
+    # scans evenly spaced windows of [start, end) so a plan can be made before
+    # the real scan. the windows are stored like any other result, returns the
+    # learned density per region and the windows that were scanned
+    def sampleDensity(self, start, end, samples):
+        width = self.controller.sizeFor(start)
+        step = max((end - start) // samples, width)
+        windows = []
+        for sampleStart in range(start, end, step):
+            jobs = [[sampleStart, min(sampleStart + width, end)]]
+            while jobs and self.running:
+                job = jobs[0]
+                try:
+                    startTime = time.time()
+                    events = self.scanChunk(job[0], job[1])
+                    latency = time.time() - startTime
+                    IfixedScan.addResults([job[0], self.decodeEvents(events), job[1]])
+                    self.throttle(
+                        events, job[0], job[1] - job[0], latency, self.responseBytes()
+                    )
+                    windows.append((job[0], job[1]))
+                    jobs.pop(0)
+                    self.failCount = 0
+                except Exception as e:
+                    self.handleError(e, jobs)
+        self.controller.save()
+        return dict(self.controller.density), windows
+
+    def responseBytes(self):
+        return None if self.raw is None else self.raw.lastBytes
+
+    def acquire(self, method, count=1):
+        if self.limiter is not None:
+            self.limiter.acquire(method, count)
+
+    def getLogs(self, filterParams):
+        if self.cache is not None:
+            return self.getCachedLogs(filterParams)
+        self.acquire("eth_getLogs")
+        if self.raw is not None:
+            return self.raw.getLogs(filterParams)
+        return self.w3.eth.get_logs(filterParams)
+
+    def getLogsBatch(self, filters):
+        if self.cache is not None:
+            return self.getCachedLogsBatch(filters)
+        self.acquire("eth_getLogs", len(filters))
+        self.acquire("eth_blockNumber")
+        return self.raw.getLogsBatch(filters)
+
+    # the cache only stores blocks below the finality depth, so it needs a
+    # recent head, refreshed at most once a minute
+    def updateCacheHead(self):
+        if self.latestBlock is not None:
+            self.cache.head = max(self.cache.head or 0, self.latestBlock)
+        if time.time() - self.cacheHeadTime > 60:
+            self.acquire("eth_blockNumber")
+            self.cache.head = self.raw.getBlockNumber()
+            self.cacheHeadTime = time.time()
+
+    def getCachedLogs(self, filterParams):
+        logs = self.cache.lookup(filterParams)
+        if logs is None:
+            self.acquire("eth_getLogs")
+            logs = self.raw.getRawLogs(filterParams)
+            self.updateCacheHead()
+            self.cache.store(filterParams, logs)
+        else:
+            # nothing came over the wire, so there is no response size sample
+            self.raw.lastBytes = 0
+            self.logDebug(
+                f"cache hit {filterParams['fromBlock']}-{filterParams['toBlock']}"
+            )
+        return [fromRawLog(log) for log in logs]
+
+    def getCachedLogsBatch(self, filters):
+        results = [self.cache.lookup(f) for f in filters]
+        misses = [i for i, logs in enumerate(results) if logs is None]
+        latest = self.latestBlock
+        if misses:
+            self.acquire("eth_getLogs", len(misses))
+            self.acquire("eth_blockNumber")
+            fetched, latest = self.raw.getLogsBatch(
+                [filters[i] for i in misses], normalize=False
+            )
+            if not isinstance(latest, Exception):
+                self.cache.head = latest
+                self.cacheHeadTime = time.time()
+            for i, logs in zip(misses, fetched):
+                results[i] = logs
+                if not isinstance(logs, Exception):
+                    self.cache.store(filters[i], logs)
+        if len(misses) < len(filters):
+            # the response size only covers the misses
+            self.raw.lastBytes = 0
+        results = [
+            r if isinstance(r, Exception) else [fromRawLog(log) for log in r]
+            for r in results
+        ]
+        return results, latest
+
     def getFilter(self, start, end):
         if self.scanMode == "ANYEVENT":
             return {
@@ -265,12 +593,11 @@ class RPC(Logger):
                 "address": [],
             }
 
-    def throttle(self, events, blockRange):
-        if len(events) > 0:
-            ratio = self.eventsTarget / (len(events))
-            targetBlocks = math.ceil(ratio * blockRange)
-            self.currentChunkSize = targetBlocks
-            self.currentChunkSize = max(self.currentChunkSize, 1)
+    def throttle(self, events, start, blockRange, latency=None, numBytes=None):
+        self.controller.onSuccess(start, blockRange, len(events), latency, numBytes)
+        if self.scheduler is not None and latency is not None:
+            self.scheduler.recordSuccess(self.endpoint, blockRange, latency)
+        self.currentChunkSize = self.chunkSizeFor(start + blockRange)
 
     def getFactor(self, current, target):
         factor = 1
@@ -278,12 +605,16 @@ class RPC(Logger):
             factor += 1
         return factor
 
-    def handleError(self, e):
+    def handleError(self, e, jobs=None):
+        if jobs is None:
+            jobs = self.jobs
         if type(e) == ValueError:
             if e.args[0]["message"] == "block range is too wide":
-                self.maxChunk = int(self.currentChunkSize * 0.98)
-                self.currentChunkSize = self.maxChunk
-                self.logInfo(f"blockrange too wide, reduced max to {self.maxChunk}")
+                blocks = jobs[0][1] - jobs[0][0] if jobs else self.currentChunkSize
+                self.currentChunkSize = self.controller.limitRange(blocks)
+                self.logInfo(
+                    f"blockrange too wide, reduced max to {self.controller.rangeLimit}"
+                )
             elif e.args[0]["message"] == "invalid params":
                 if "Try with this block range" in e.args[0]["data"]:
                     match = re.search(
@@ -295,79 +626,111 @@ class RPC(Logger):
                         self.logInfo(
                             f"too many events, suggested range {suggestedLength}"
                         )
+                        self.controller.backOff(suggestedLength, 1)
                         self.splitJob(
-                            math.ceil(self.currentChunkSize / suggestedLength)
+                            math.ceil(self.currentChunkSize / suggestedLength),
+                            jobs=jobs,
                         )
                     else:
                         self.logWarn(
                             f"unable to find suggested block range, splitting jobs"
                         )
-                        self.splitJob(2)
+                        self.splitJob(2, jobs=jobs)
 
             elif e.args[0]["message"] == "rate limit exceeded":
-                self.logInfo(f"rate limited trying again")
-                time.sleep(0.5)
+                self.rateLimited(jobs)
             elif "response size should not greater than" in e.args[0]["message"]:
                 self.logInfo(f"too much data, splitting job, {e}")
-                self.splitJob(2)
+                self.controller.backOff(jobs[0][1] - jobs[0][0])
+                self.splitJob(2, jobs=jobs)
             else:
                 self.logWarn(
                     f"unhandled error {type(e), e}, {traceback.format_exc()} splitting jobs",
                     True,
                 )
-                self.splitJob(2)
+                self.splitJob(2, jobs=jobs)
                 self.failCount += 1
+                self.reportError(jobs)
         elif type(e) == asyncio.exceptions.TimeoutError:
             self.logInfo(f"timeout error, splitting jobs")
-            self.splitJob(2)
+            self.controller.backOff(jobs[0][1] - jobs[0][0])
+            self.splitJob(2, jobs=jobs)
             self.failCount += 1
+            self.reportError(jobs)
         elif type(e) == KeyboardInterrupt:
             pass
+        # sync providers raise requests' error, async ones and the hedger aiohttp's
+        elif (
+            isinstance(e, requests.exceptions.HTTPError)
+            and e.response is not None
+            and e.response.status_code == 429
+        ) or (isinstance(e, aiohttp.ClientResponseError) and e.status == 429):
+            self.rateLimited(jobs)
         else:
             self.logWarn(
                 f"unhandled error {type(e), e},{traceback.format_exc()}  splitting jobs",
                 True,
             )
-            time.sleep(0.5)
-            self.splitJob(2)
+            self.pause(0.5)
+            self.splitJob(2, jobs=jobs)
             self.failCount += 1
+            self.reportError(jobs)
+        if self.scheduler is not None:
+            # the scheduler benches failing endpoints instead
+            return
+        # ranges handed back are dropped locally so they aren't scanned twice
         if self.failCount == 10:
-            for job in self.jobs:
-                IfixedScan.addScanRange(job[0], job[1])
+            self.releaseJobs(jobs)
         elif self.failCount > 20:
-            for job in self.jobs:
-                IfixedScan.addScanRange(job[0], job[1])
+            self.releaseJobs(jobs)
             self.logCritical("too many failures, rpc shutting down")
             self.running = False
 
-    def splitJob(self, numJobs, reduceChunkSize=True):
-        oldJob = self.jobs[0]
+    def rateLimited(self, jobs):
+        self.logInfo(f"rate limited trying again")
+        if self.limiter is not None:
+            # slows every process sharing the provider, not just this one
+            self.limiter.backOff()
+        else:
+            self.pause(0.5)
+        self.reportError(jobs, True)
+
+    def reportError(self, jobs, rateLimited=False):
+        if self.scheduler is None:
+            return
+        benched = self.scheduler.recordError(self.endpoint, rateLimited)
+        if self.scheduler.othersHealthy(self.endpoint):
+            # let a different endpoint retry the failed ranges
+            self.releaseJobs(jobs, self.endpoint)
+        elif benched:
+            # nobody else can take them, so they go back untagged
+            self.releaseJobs(jobs)
+        if benched:
+            self.logWarn(
+                f"endpoint unhealthy, benched for {benched}s: {self.scheduler.stats(self.endpoint)}",
+                True,
+            )
+            self.failCount = 0
+
+    def pause(self, seconds):
+        time.sleep(seconds)
+
+    def benchedFor(self):
+        if self.scheduler is None:
+            return 0
+        return self.scheduler.benchedFor(self.endpoint)
+
+    def splitJob(self, numJobs, reduceChunkSize=True, jobs=None):
+        if jobs is None:
+            jobs = self.jobs
+        oldJob = jobs[0]
         chunkSize = math.ceil((oldJob[1] - oldJob[0]) / numJobs)
         if reduceChunkSize:
             self.currentChunkSize = chunkSize
         current = oldJob[0]
         for i in range(numJobs):
-            self.jobs.insert(1 + i, [current, current + chunkSize])
+            jobs.insert(1 + i, [current, current + chunkSize])
             current += chunkSize
 
-        self.logInfo(
-            f"split Job {self.jobs[0]} to {chunkSize} blocks: {self.jobs[1:1+numJobs]}"
-        )
-        self.jobs.pop(0)
-
-    def getEventData(self, events):
-        decodedEvents = {}
-        for param in events:
-            blockNumber, txHash, address, index = getEventParameters(param)
-            if blockNumber not in decodedEvents:
-                decodedEvents[blockNumber] = {}
-            if txHash not in decodedEvents[blockNumber]:
-                decodedEvents[blockNumber][txHash] = {}
-            if address not in decodedEvents[blockNumber][txHash]:
-                decodedEvents[blockNumber][txHash][address] = {}
-            decodedEvents[blockNumber][txHash][address][index] = {}
-            for eventName, eventParam in param["args"].items():
-                decodedEvents[blockNumber][txHash][address][index][
-                    eventName
-                ] = eventParam
-        return decodedEvents
+        self.logInfo(f"split Job {jobs[0]} to {chunkSize} blocks: {jobs[1:1+numJobs]}")
+        jobs.pop(0)
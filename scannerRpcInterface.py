@@ -1,6 +1,9 @@
 import multiprocessing
 import copy
+import pickle
+import queue
 from logger import Logger
+from rangeAllocator import RangeAllocator
 
 
 class ScannerRPCInterface(Logger):
@@ -14,18 +17,13 @@ class ScannerRPCInterface(Logger):
         self.sync.request = None
         self.sync.result = None
         self.sync.count = 0
-        self._fixedScanRequests = self.manager.list()
-        self._results = self.manager.dict()
-        self._fixedScanResults = self.manager.list()
+        self._fixedScanRequests = RangeAllocator(settings.get("MAXRANGES", 4096))
+        self._results = multiprocessing.Queue()
+        self._fixedScanResults = multiprocessing.Queue()
         # Creating reentrant locks for each variable
-        self._fixedScanRequests_lock = multiprocessing.RLock()
         self._lastBlock_lock = multiprocessing.RLock()
         self._start_lock = multiprocessing.RLock()
         self._end_lock = multiprocessing.RLock()
-        self._fixedScanResult_lock = multiprocessing.RLock()
-        self._fixedScanResults_lock_condition = multiprocessing.Condition(
-            self._fixedScanResult_lock
-        )
         self._state_sync_request_lock = multiprocessing.RLock()
         self._state_sync_request_lock_condition = multiprocessing.Condition(
             self._state_sync_request_lock
@@ -34,8 +32,6 @@ class ScannerRPCInterface(Logger):
         self._sync_result_lock_condition = multiprocessing.Condition(
             self._sync_result_lock
         )
-        self._results_lock = multiprocessing.RLock()
-        self._results_lock_condition = multiprocessing.Condition(self._results_lock)
 
     def asyncRequest(self, request, args=(), kwarg={}, count=1):
         pass
@@ -141,58 +137,50 @@ class ScannerRPCInterface(Logger):
         with self._end_lock:
             self._end.value = value
 
-    def addScanRange(self, start, end):
-        with self._fixedScanRequests_lock:
-            self._fixedScanRequests.insert(0, [start, end])
-
-    def getScanJob(self, maxSize):
-        with self._fixedScanRequests_lock:
-            while (
-                self._fixedScanRequests
-                and self._fixedScanRequests[0][0] == self._fixedScanRequests[0][1]
-            ):
-                self._fixedScanRequests.pop(0)
-
-            if not self._fixedScanRequests:
-                return []
-            startBlock = self._fixedScanRequests[0][0]
-            endBlock = min([startBlock + maxSize, self._fixedScanRequests[0][1]])
-            self._fixedScanRequests[0] = (endBlock, self._fixedScanRequests[0][1])
-            self.logDebug(
-                f"distributed job {(startBlock, endBlock)}, remaining range: {self._fixedScanRequests[0][0]} - {self._fixedScanRequests[0][1]}"
-            )
-            return (startBlock, endBlock)
+    def addScanRange(self, start, end, jobSize=0, avoid=-1):
+        self._fixedScanRequests.addRange(start, end, jobSize, avoid)
+
+    def setScanLimit(self, limit):
+        self._fixedScanRequests.setLimit(limit)
+
+    def getScanJob(self, maxSize, endpoint=-1, avoid=False):
+        job = self._fixedScanRequests.getJob(maxSize, endpoint, avoid)
+        if job:
+            self.logDebug(f"distributed job {job}")
+        return job
 
     def addScanResults(self, result):
-        with self._fixedScanResult_lock:
-            self._fixedScanResults.append(result)
-            with self._fixedScanResults_lock_condition:
-                self.logInfo(f"scan results added, blocks {result[0]}-{result[2]}")
-                self._fixedScanResults_lock_condition.notify_all()
+        self._fixedScanResults.put(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        self.logInfo(f"scan results added, blocks {result[0]}-{result[2]}")
+
+    def drain(self, resultQueue, blocking):
+        # each batch is unpickled exactly once, here in the reading process
+        try:
+            payloads = [resultQueue.get(blocking)]
+        except queue.Empty:
+            return []
+        try:
+            while True:
+                payloads.append(resultQueue.get_nowait())
+        except queue.Empty:
+            pass
+        return [(pickle.loads(payload), len(payload)) for payload in payloads]
 
     def readScanResults(self, blocking=True):
-        with self._fixedScanResult_lock:
-            while len(self._fixedScanResults) == 0:
-                if blocking:
-                    with self._fixedScanResults_lock_condition:
-                        self._fixedScanResults_lock_condition.wait()
-                else:
-                    return []
-            results = copy.deepcopy(self._fixedScanResults)
-            self.logInfo(f"scan results read and cleared, blocks")
-            self._fixedScanResults[:] = []
-            return results
+        # the serialized size rides along so the file handler can bound its buffer
+        results = [
+            list(result) + [size]
+            for result, size in self.drain(self._fixedScanResults, blocking)
+        ]
+        if results:
+            self.logInfo(f"scan results read and cleared, {len(results)} batches")
+        return results
 
     def getLiveResults(self, blocking=True):
-        with self._results_lock:
-            if blocking:
-                while len(self._results) == 0:
-                    with self._results_lock_condition:
-                        self._results_lock_condition.wait()
-            elif len(self._results) == 0:
-                return {}
-            results = copy.deepcopy(self._results)
-            self._results.clear()
+        results = {}
+        for data, size in self.drain(self._results, blocking):
+            results.update(data)
+        if results:
             self.logInfo(f"live scan results read and cleared")
         return results
 
@@ -202,9 +190,6 @@ class ScannerRPCInterface(Logger):
         if not data:
             return
         latestBlock = min(list(data.keys())[-1], start)
-        with self._results_lock:
-            self._results.update(data)
-            self.start = self.end = latestBlock
-            with self._results_lock_condition:
-                self.logInfo(f"live scan results added from {start} to {latestBlock}")
-                self._results_lock_condition.notify_all()
+        self._results.put(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        self.start = self.end = latestBlock
+        self.logInfo(f"live scan results added from {start} to {latestBlock}")
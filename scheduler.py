@@ -0,0 +1,109 @@
+import multiprocessing
+import time
+
+ALPHA = 0.2
+# fields kept per endpoint in shared memory
+THROUGHPUT, ERRORRATE, RATELIMITS, REQUESTS, BENCHEDUNTIL, BENCHES, ACTIVE = range(7)
+FIELDS = 7
+
+
+# health and speed of every endpoint in shared memory so each rpc process can
+# size its jobs against the others and step aside while it is failing
+class Scheduler:
+    def __init__(self, numEndpoints, settings):
+        self.numEndpoints = numEndpoints
+        self.benchErrorRate = settings.get("BENCHERRORRATE", 0.5)
+        self.benchTime = settings.get("BENCHTIME", 30)
+        self.minRequests = settings.get("BENCHMINREQUESTS", 10)
+        self.maxWeight = settings.get("MAXWEIGHT", 4)
+        self._stats = multiprocessing.RawArray("d", numEndpoints * FIELDS)
+        self._lock = multiprocessing.Lock()
+
+    def get(self, endpoint, field):
+        return self._stats[endpoint * FIELDS + field]
+
+    def set(self, endpoint, field, value):
+        self._stats[endpoint * FIELDS + field] = value
+
+    def average(self, endpoint, field, sample):
+        previous = self.get(endpoint, field)
+        if self.get(endpoint, REQUESTS) == 0:
+            self.set(endpoint, field, sample)
+        else:
+            self.set(endpoint, field, previous + ALPHA * (sample - previous))
+
+    # only endpoints that are running and take fixed scan jobs count as
+    # somewhere a failed range can go
+    def register(self, endpoint):
+        self.set(endpoint, ACTIVE, 1)
+
+    def retire(self, endpoint):
+        self.set(endpoint, ACTIVE, 0)
+
+    def recordSuccess(self, endpoint, blocks, latency):
+        with self._lock:
+            if latency > 0:
+                self.average(endpoint, THROUGHPUT, blocks / latency)
+            self.average(endpoint, ERRORRATE, 0)
+            self.set(endpoint, REQUESTS, self.get(endpoint, REQUESTS) + 1)
+            self.set(endpoint, BENCHES, 0)
+
+    # returns the number of seconds the endpoint is benched for, 0 if it may
+    # keep going
+    def recordError(self, endpoint, rateLimited=False):
+        with self._lock:
+            self.average(endpoint, ERRORRATE, 0.5 if rateLimited else 1)
+            self.set(endpoint, REQUESTS, self.get(endpoint, REQUESTS) + 1)
+            if rateLimited:
+                self.set(endpoint, RATELIMITS, self.get(endpoint, RATELIMITS) + 1)
+            if (
+                self.get(endpoint, ERRORRATE) < self.benchErrorRate
+                or self.get(endpoint, REQUESTS) < self.minRequests
+            ):
+                return 0
+            # repeated benches back off exponentially
+            benches = self.get(endpoint, BENCHES)
+            duration = self.benchTime * 2 ** min(benches, 5)
+            self.set(endpoint, BENCHEDUNTIL, time.time() + duration)
+            self.set(endpoint, BENCHES, benches + 1)
+            # come back with a clean slate so one success keeps it in rotation
+            self.set(endpoint, ERRORRATE, 0)
+            self.set(endpoint, REQUESTS, 0)
+            return duration
+
+    def benchedFor(self, endpoint):
+        return max(0, self.get(endpoint, BENCHEDUNTIL) - time.time())
+
+    def healthy(self, endpoint):
+        return self.get(endpoint, ACTIVE) == 1 and self.benchedFor(endpoint) == 0
+
+    def othersHealthy(self, endpoint):
+        return any(
+            self.healthy(other)
+            for other in range(self.numEndpoints)
+            if other != endpoint
+        )
+
+    # throughput relative to the mean of healthy endpoints, scaled down by the
+    # error rate, so fast reliable nodes ask for bigger ranges
+    def weight(self, endpoint):
+        with self._lock:
+            speeds = [
+                self.get(other, THROUGHPUT)
+                for other in range(self.numEndpoints)
+                if self.healthy(other) and self.get(other, THROUGHPUT) > 0
+            ]
+            speed = self.get(endpoint, THROUGHPUT)
+            if not speeds or speed == 0:
+                return 1
+            weight = speed / (sum(speeds) / len(speeds))
+            weight *= 1 - self.get(endpoint, ERRORRATE) / 2
+        return min(max(weight, 1 / self.maxWeight), self.maxWeight)
+
+    def stats(self, endpoint):
+        return {
+            "throughput": self.get(endpoint, THROUGHPUT),
+            "errorRate": self.get(endpoint, ERRORRATE),
+            "rateLimits": int(self.get(endpoint, RATELIMITS)),
+            "benchedFor": self.benchedFor(endpoint),
+        }
@@ -0,0 +1,195 @@
+import json
+import sqlite3
+import time
+from eth_utils import to_checksum_address
+from fileHandler import FileHandler
+
+
+# keeps events and the scanned block ranges in a single sqlite database,
+# saves only insert the blocks merged since the previous save
+class SqliteFileHandler(FileHandler):
+    extension = "db"
+
+    def __init__(self, settings=None, path=None):
+        super().__init__(settings, path)
+        self.db = sqlite3.connect(self.filePath + "events.db")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                block INTEGER NOT NULL,
+                logIndex INTEGER NOT NULL,
+                txHash TEXT NOT NULL,
+                address TEXT NOT NULL,
+                event TEXT NOT NULL,
+                args TEXT NOT NULL,
+                PRIMARY KEY (block, logIndex)
+            );
+            CREATE INDEX IF NOT EXISTS eventsByAddress ON events (address, block);
+            CREATE INDEX IF NOT EXISTS eventsByEvent ON events (event, block);
+            CREATE TABLE IF NOT EXISTS coverage (
+                start INTEGER PRIMARY KEY,
+                end INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS coverageByEnd ON coverage (end);
+            """)
+        self.db.commit()
+
+    def toRows(self, data):
+        for block, blockData in data.items():
+            for txHash, txEvents in blockData.items():
+                for address, addressEvents in txEvents.items():
+                    for key, args in addressEvents.items():
+                        name, logIndex = key.rsplit(" ", 1)
+                        yield (
+                            int(block),
+                            int(logIndex),
+                            txHash,
+                            address,
+                            name,
+                            json.dumps(args),
+                        )
+
+    def addCoverage(self, start, end):
+        overlapping = self.db.execute(
+            "SELECT start, end FROM coverage WHERE end >= ? AND start <= ?",
+            (start, end),
+        ).fetchall()
+        for rangeStart, rangeEnd in overlapping:
+            start = min(start, rangeStart)
+            end = max(end, rangeEnd)
+        self.db.execute(
+            "DELETE FROM coverage WHERE end >= ? AND start <= ?", (start, end)
+        )
+        self.db.execute("INSERT INTO coverage VALUES (?, ?)", (start, end))
+
+    def save(self):
+        if not self.currentData and self.latest == self.start:
+            self.logDebug(f"{self.currentFile} not saved, no changed data")
+            return
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                self.toRows(self.currentData),
+            )
+            if self.latest > self.start:
+                self.addCoverage(self.start, self.latest)
+        self.logInfo(
+            f"saved {len(self.currentData)} blocks, covered {self.start} to {self.latest}"
+        )
+        self.currentData = {}
+        self.unsaved = {}
+        self.start = self.latest
+        self.currentFile = (self.start, self.latest)
+        self.lastSave = time.time()
+        self.saveView()
+
+    # blocks already saved are deleted from the database as well, so unlike
+    # segments the rollback can reach before the unsaved blocks. the next save
+    # covers from the fork only
+    def rollback(self, block):
+        self.start = min(self.start, block)
+        super().rollback(block)
+        self.removed = set()
+        with self.db:
+            self.db.execute("DELETE FROM events WHERE block >= ?", (block,))
+            self.db.execute("DELETE FROM coverage WHERE start >= ?", (block,))
+            self.db.execute("UPDATE coverage SET end = ? WHERE end > ?", (block, block))
+        self.currentFile = (self.start, self.latest)
+
+    # one indexed lookup per pair for whatever isn't in the unsaved blocks
+    def latestBefore(self, block, keys):
+        remaining = {(address.lower(), event) for address, event in keys}
+        found = []
+        for event in self.currentEventsBefore(block):
+            key = (event[2].lower(), event[3])
+            if key in remaining:
+                found.append(event)
+                remaining.discard(key)
+        for address, name in remaining:
+            row = self.db.execute(
+                "SELECT block, txHash, address, event, logIndex, args FROM events "
+                "WHERE address = ? AND event = ? AND block < ? "
+                "ORDER BY block DESC, logIndex DESC LIMIT 1",
+                (to_checksum_address(address), name, block),
+            ).fetchone()
+            if row is not None:
+                found.append((*row[:5], json.loads(row[5])))
+        return found
+
+    def compact(self, indent=None):
+        self.save()
+
+    # the coverage table takes the place of the segment manifest
+    def loadManifest(self, rebuild=False):
+        pass
+
+    def getFiles(self):
+        return self.db.execute(
+            "SELECT start, end FROM coverage ORDER BY start"
+        ).fetchall()
+
+    def setup(self, startBlock):
+        self.logInfo("setting up new scan")
+        if self.currentFile != None:
+            self.save()
+        covering = self.db.execute(
+            "SELECT end FROM coverage WHERE start <= ? AND end >= ?",
+            (startBlock, startBlock),
+        ).fetchone()
+        if covering is None:
+            self.createNewFile(startBlock)
+        else:
+            self.createNewFile(covering[0])
+        self.loadView()
+        self.logDebug(f"setup complete, waiting for {self.latest}")
+        return self.latest
+
+    def checkMissing(self, start, end):
+        ranges = self.db.execute(
+            "SELECT start, end FROM coverage WHERE end > ? AND start < ? ORDER BY start",
+            (start, end),
+        ).fetchall()
+        missing = []
+        for rangeStart, rangeEnd in ranges:
+            if rangeStart > start:
+                missing.append((start, rangeStart))
+            start = max(rangeEnd, start)
+        if start < end:
+            missing.append((start, end))
+        self.logDebug(f"missing ranges: {missing}")
+        return missing
+
+    def getEvents(self, start, end, results):
+        data = {}
+        rows = self.db.execute(
+            "SELECT block, logIndex, txHash, address, event, args FROM events "
+            "WHERE block >= ? AND block <= ? ORDER BY block, logIndex",
+            (start, end),
+        )
+        for block, logIndex, txHash, address, name, args in rows:
+            blockData = data.setdefault(str(block), {})
+            addressEvents = blockData.setdefault(txHash, {}).setdefault(address, {})
+            addressEvents[f"{name} {logIndex}"] = json.loads(args)
+        results.append(data)
+        return results
+
+    def iterEvents(self, start, end, addresses=None, events=None):
+        query = (
+            "SELECT block, txHash, address, event, logIndex, args FROM events "
+            "WHERE block >= ? AND block <= ?"
+        )
+        params = [start, end]
+        if addresses is not None:
+            addresses = [to_checksum_address(address) for address in addresses]
+            query += f" AND address IN ({','.join('?' * len(addresses))})"
+            params += addresses
+        if events is not None:
+            events = list(events)
+            query += f" AND event IN ({','.join('?' * len(events))})"
+            params += events
+        query += " ORDER BY block, logIndex"
+        for block, txHash, address, name, logIndex, args in self.db.execute(
+            query, params
+        ):
+            yield block, txHash, address, name, logIndex, json.loads(args)
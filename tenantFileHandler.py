@@ -0,0 +1,131 @@
+from logger import Logger
+from reorgTracker import ROLLBACK
+
+
+# the part of the superset results one scan configuration asked for, by
+# contract in ANYEVENT mode and by topic0 in ANYCONTRACT mode. eventTopics
+# maps (name, argument names) of a decoded event to its possible topic0s
+class Tenant:
+    def __init__(self, name, scanMode, scanSettings, fileHandler, topic0s, eventTopics):
+        self.name = name
+        self.scanMode = scanMode
+        self.fileHandler = fileHandler
+        self.addresses = {address.lower() for address in scanSettings["CONTRACTS"]}
+        self.topic0s = topic0s
+        self.eventTopics = eventTopics
+        # the range last checked for missing blocks and what was missing in it
+        self.checked = (0, 0)
+        self.missing = []
+
+    def accepts(self, address, event, args):
+        if self.scanMode == "ANYEVENT":
+            return address.lower() in self.addresses
+        key = (event.rsplit(" ", 1)[0], frozenset(args))
+        return not self.topic0s.isdisjoint(self.eventTopics.get(key, ()))
+
+    def setMissing(self, start, end, missing):
+        self.checked = (start, end)
+        self.missing = missing
+
+    def isCovered(self, block):
+        start, end = self.checked
+        return start <= block < end and not any(
+            missingStart <= block < missingEnd
+            for missingStart, missingEnd in self.missing
+        )
+
+    # blocks the handler stored already are left out, so they aren't merged
+    # and written again
+    def select(self, data):
+        selected = {}
+        for block, blockData in data.items():
+            if self.isCovered(int(block)):
+                continue
+            for txHash, txEvents in blockData.items():
+                for address, addressEvents in txEvents.items():
+                    events = {
+                        event: args
+                        for event, args in addressEvents.items()
+                        if self.accepts(address, event, args)
+                    }
+                    if events:
+                        txSelected = selected.setdefault(block, {}).setdefault(
+                            txHash, {}
+                        )
+                        txSelected[address] = events
+        return selected
+
+
+# one scan fetching the union filter of several configurations, every result
+# is split into each configuration's own file handler. the handlers are
+# driven together, so the scan covers whatever any of them is missing. blocks
+# a handler already stored only advance its latest block
+class TenantFileHandler(Logger):
+    def __init__(self, tenants, debugLevel="HIGH"):
+        super().__init__(debugLevel)
+        self.tenants = tenants
+        self.primary = tenants[0].fileHandler
+
+    @property
+    def latest(self):
+        return min(tenant.fileHandler.latest for tenant in self.tenants)
+
+    def process(self, results):
+        numBlocks = 0
+        for i, tenant in enumerate(self.tenants):
+            tenantResults = []
+            for result in results:
+                if result[2] == ROLLBACK:
+                    tenantResults.append(result)
+                    continue
+                element = [result[0], tenant.select(result[1]), result[2]]
+                # only the primary handler accounts for buffered bytes
+                if i == 0:
+                    element += result[3:]
+                tenantResults.append(element)
+            blocks = tenant.fileHandler.process(tenantResults)
+            numBlocks = blocks if i == 0 else min(numBlocks, blocks)
+        return numBlocks
+
+    def save(self):
+        for tenant in self.tenants:
+            tenant.fileHandler.save()
+
+    def setup(self, startBlock):
+        for tenant in self.tenants:
+            tenant.fileHandler.setup(startBlock)
+        return self.latest
+
+    # union of the ranges each handler is missing
+    def checkMissing(self, start, end):
+        for tenant in self.tenants:
+            tenant.setMissing(start, end, tenant.fileHandler.checkMissing(start, end))
+        ranges = sorted(
+            missing for tenant in self.tenants for missing in tenant.missing
+        )
+        merged = []
+        for missingStart, missingEnd in ranges:
+            if merged and missingStart <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], missingEnd))
+            else:
+                merged.append((missingStart, missingEnd))
+        self.logDebug(f"missing across tenants: {merged}")
+        return merged
+
+    def getScanLimit(self):
+        limits = [
+            limit
+            for limit in (tenant.fileHandler.getScanLimit() for tenant in self.tenants)
+            if limit != -1
+        ]
+        return min(limits) if limits else -1
+
+    # queries read the scan's own configuration
+    def getEvents(self, start, end, results):
+        return self.primary.getEvents(start, end, results)
+
+    def iterEvents(self, start, end, addresses=None, events=None):
+        return self.primary.iterEvents(start, end, addresses, events)
+
+    def getLatest(self, address, event):
+        return self.primary.getLatest(address, event)
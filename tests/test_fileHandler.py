@@ -0,0 +1,132 @@
+import pytest
+from configLoader import fileSettings
+import os
+from fileHandler import MANIFEST, FileHandler, iterJsonItems
+
+ADDRESS = "0x78b3C724A2F663D11373C4a1978689271895256f"
+
+
+def blockData(block, name="Sync"):
+    return {f"0x{block:04x}": {ADDRESS: {f"{name} {block}": {"block": block}}}}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return f"{tmp_path}/"
+
+
+def newHandler(path):
+    settings = dict(fileSettings, FILENAME="data", LATESTVIEW=False, STORAGE="JSON")
+    return FileHandler(settings, path)
+
+
+# a segment stored up to block 10, resumed and scanned again from its last block
+def resumed(path):
+    handler = newHandler(path)
+    handler.setup(0)
+    handler.process([[0, {5: blockData(5), 10: blockData(10)}, 10]])
+    handler.compact()
+    handler = newHandler(path)
+    handler.setup(10)
+    handler.process([[10, {10: blockData(10), 12: blockData(12)}, 20]])
+    return handler
+
+
+def test_rescanned_boundary_block_is_stored_once(path):
+    handler = resumed(path)
+    assert list(handler.currentData) == ["5", "10", "12"]
+    blocks = [event[0] for event in handler.iterEvents(0, 20)]
+    assert blocks == [5, 10, 12]
+
+
+def test_compacted_segment_has_unique_blocks(path):
+    handler = resumed(path)
+    handler.compact()
+    fileName = handler.filePath + handler.toFileName(handler.getFiles()[-1])
+    assert [block for block, data in iterJsonItems(fileName)] == ["5", "10", "12"]
+
+
+def assertFiltersAgree(handler):
+    everything = list(handler.iterEvents(0, 20))
+    filtered = list(handler.iterEvents(0, 20, [ADDRESS], ["Sync"]))
+    assert filtered == everything
+    assert [event[0] for event in everything] == [5, 10, 12]
+
+
+def test_filtered_and_unfiltered_reads_agree(path):
+    handler = resumed(path)
+    assertFiltersAgree(handler)
+    handler.compact()
+    # finished segments are read through their index when filtered
+    assertFiltersAgree(newHandler(path))
+
+
+def test_sqlite_rollback_uncovers_the_dropped_blocks(path, caplog):
+    from sqliteFileHandler import SqliteFileHandler
+
+    settings = dict(fileSettings, FILENAME="data", LATESTVIEW=False, STORAGE="SQLITE")
+    handler = SqliteFileHandler(settings, path)
+    handler.setup(0)
+    data = {block: blockData(block) for block in (5, 10, 11, 13, 15)}
+    handler.process([[0, data, 20]])
+    handler.save()
+    handler.process([[12, {}, -2]])
+    handler.save()
+    assert handler.getFiles() == [(0, 12)]
+    assert handler.checkMissing(0, 20) == [(12, 20)]
+    assert [event[0] for event in handler.iterEvents(0, 20)] == [5, 10, 11]
+    assert "reaches before" not in caplog.text
+
+
+def test_view_stays_in_line_with_finished_segments(path):
+    settings = dict(fileSettings, FILENAME="data", LATESTVIEW=True, STORAGE="JSON")
+    handler = FileHandler(settings, path)
+    handler.setup(0)
+    data = {block: blockData(block) for block in (5, 11, 12, 13)}
+    handler.process([[0, data, 14]])
+    handler.compact()
+    handler.createNewFile()
+    handler.process([[14, {15: blockData(15)}, 16]])
+    assert handler.getLatest(ADDRESS, "Sync")[0] == 15
+    # the reorg reaches into the finished segment, which keeps 11 to 13
+    handler.process([[11, {}, -2]])
+    assert handler.getLatest(ADDRESS, "Sync")[0] == 13
+
+
+# finished segments 0-10 and 10-20 run into each other, 20-30 was never scanned
+def segmented(path):
+    handler = newHandler(path)
+    for start, end in ((0, 10), (10, 20), (30, 40)):
+        handler.createNewFile(start)
+        handler.process([[start, {start + 1: blockData(start + 1)}, end]])
+        handler.compact()
+    return handler
+
+
+def assertSegmentLookups(handler):
+    assert handler.getFiles() == [(0, 10), (10, 20), (30, 40)]
+    for block in (0, 5, 10, 20):
+        assert handler.getLatestFileFrom(block) == (10, 20)
+    assert handler.getLatestFileFrom(25) is None
+    assert handler.getLatestFileFrom(30) == (30, 40)
+    assert handler.getLatestFileFrom(40) == (30, 40)
+    assert handler.getLatestFileFrom(41) is None
+    assert handler.checkMissing(0, 50) == [(20, 30), (40, 50)]
+    assert handler.checkMissing(5, 20) == []
+    assert handler.checkMissing(10, 30) == [(20, 30)]
+    assert handler.checkMissing(15, 35) == [(20, 30)]
+    assert handler.checkMissing(22, 28) == [(22, 28)]
+    assert handler.checkMissing(40, 45) == [(40, 45)]
+
+
+def test_segment_lookups_at_gaps_and_edges(path):
+    assertSegmentLookups(segmented(path))
+    # a resumed handler answers from the manifest
+    assertSegmentLookups(newHandler(path))
+
+
+def test_missing_manifest_is_rebuilt(path):
+    manifest = segmented(path).filePath + MANIFEST
+    os.remove(manifest)
+    assertSegmentLookups(newHandler(path))
+    assert os.path.exists(manifest)
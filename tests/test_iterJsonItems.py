@@ -0,0 +1,53 @@
+import json
+import pytest
+from fileHandler import iterJsonItems, encodeSegment
+
+DATA = {
+    "100": {"0xaa": {"0xBB": {"Sync 0": {"reserve0": 123456789, "reserve1": -1.5e3}}}},
+    "101": {},
+    "102": {"0xcc": {"0xDD": {"Swap 3": {"to": 'a}b,c:d"e', "amounts": [1, 22, 333]}}}},
+    "1030": 4567,
+}
+
+
+@pytest.fixture
+def segment(tmp_path):
+    def write(text):
+        path = tmp_path / "segment.json"
+        path.write_text(text)
+        return str(path)
+
+    return write
+
+
+@pytest.mark.parametrize("indent", [None, 4])
+def test_every_chunk_boundary(segment, indent):
+    path = segment(json.dumps(DATA, indent=indent))
+    for chunkSize in range(1, 40):
+        assert list(iterJsonItems(path, chunkSize)) == list(DATA.items())
+
+
+def test_numbers_split_at_the_chunk_edge(segment):
+    path = segment('{"1": 1234567, "2": 89}')
+    for chunkSize in range(1, 25):
+        assert list(iterJsonItems(path, chunkSize)) == [("1", 1234567), ("2", 89)]
+
+
+def test_encoded_segment(segment):
+    text, offsets = encodeSegment(DATA, 4)
+    path = segment(text)
+    assert list(iterJsonItems(path, 7)) == list(DATA.items())
+
+
+def test_empty_object(segment):
+    assert list(iterJsonItems(segment(" { } "), 1)) == []
+
+
+def test_not_an_object(segment):
+    with pytest.raises(ValueError):
+        list(iterJsonItems(segment("[1, 2]"), 4))
+
+
+def test_truncated_file(segment):
+    with pytest.raises(json.JSONDecodeError):
+        list(iterJsonItems(segment('{"1": {"a": 1}, "2": {"b"'), 4))
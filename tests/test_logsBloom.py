@@ -0,0 +1,40 @@
+from eth_utils import keccak
+from logsBloom import LogsBloom, bloomMask, toBloomInt
+
+ADDRESS = "0x78b3C724A2F663D11373C4a1978689271895256f"
+TOPIC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+OTHER = "0x000000000000000000000000000000000000dEaD"
+
+
+# the byte layout geth uses for a 2048 bit bloom
+def gethBloom(*values):
+    bloom = bytearray(256)
+    for value in values:
+        digest = keccak(bytes.fromhex(value[2:]))
+        for i in (0, 2, 4):
+            bit = ((digest[i] << 8) | digest[i + 1]) & 2047
+            bloom[255 - bit // 8] |= 1 << (bit % 8)
+    return "0x" + bloom.hex()
+
+
+def test_mask_sets_three_bits():
+    assert 1 <= bin(bloomMask(ADDRESS)).count("1") <= 3
+
+
+def test_mask_matches_the_block_layout():
+    assert bloomMask(ADDRESS) == toBloomInt(gethBloom(ADDRESS))
+    assert bloomMask(TOPIC) == toBloomInt(gethBloom(TOPIC))
+
+
+def test_filter_needs_an_address_and_a_topic():
+    bloom = LogsBloom({"address": [ADDRESS], "topics": [[TOPIC]]})
+    assert bloom.mayMatch(gethBloom(ADDRESS, TOPIC, OTHER))
+    assert not bloom.mayMatch(gethBloom(ADDRESS))
+    assert not bloom.mayMatch(gethBloom(TOPIC, OTHER))
+
+
+def test_empty_parts_of_the_filter_match_anything():
+    bloom = LogsBloom({"address": [], "topics": [[TOPIC]]})
+    assert bloom.mayMatch(gethBloom(TOPIC))
+    assert LogsBloom({"address": ADDRESS, "topics": []}).mayMatch(gethBloom(ADDRESS))
+    assert not bloom.mayMatch("0x" + "00" * 256)
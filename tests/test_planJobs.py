@@ -0,0 +1,37 @@
+from chunkController import planJobs, excludeRanges
+
+
+def test_without_density_the_range_is_one_job():
+    assert planJobs(0, 500, {}, 100, 1000, 50) == [(0, 500, 0)]
+
+
+def test_job_size_follows_density():
+    density = {0: 10, 1: 100}
+    plan = planJobs(0, 200, density, 100, 1000, 500)
+    assert plan == [(0, 100, 100), (100, 200, 10)]
+
+
+def test_equal_regions_are_merged():
+    density = {0: 10, 1: 10, 2: 10}
+    assert planJobs(50, 300, density, 100, 1000, 500) == [(50, 300, 100)]
+
+
+def test_sizes_are_clamped():
+    density = {0: 0, 1: 1e9}
+    plan = planJobs(0, 200, density, 100, 1000, 500)
+    assert plan == [(0, 100, 500), (100, 200, 1)]
+
+
+def test_unknown_regions_borrow_the_nearest_density():
+    density = {0: 10, 5: 100}
+    plan = planJobs(0, 600, density, 100, 1000, 500)
+    assert plan == [(0, 300, 100), (300, 600, 10)]
+
+
+def test_scanned_ranges_are_left_out():
+    plan = [(0, 100, 10), (100, 300, 50)]
+    assert excludeRanges(plan, [(200, 210), (90, 120)]) == [
+        (0, 90, 10),
+        (120, 200, 50),
+        (210, 300, 50),
+    ]
@@ -0,0 +1,69 @@
+import pytest
+from rangeAllocator import RangeAllocator
+
+
+def test_jobs_come_from_the_front():
+    allocator = RangeAllocator(4)
+    allocator.addRange(150, 200)
+    allocator.addRange(0, 100)
+    assert allocator.getJob(60) == (0, 60, 0)
+    assert allocator.getJob(60) == (60, 100, 0)
+    assert allocator.getJob(60) == (150, 200, 0)
+
+
+def test_wraps_around_the_ring():
+    allocator = RangeAllocator(2)
+    for i in range(5):
+        allocator.addRange(i * 10, i * 10 + 5)
+        allocator.addRange(100 + i * 10, 100 + i * 10 + 5)
+        assert len(allocator) == 2
+        assert allocator.getJob(10) == (100 + i * 10, 100 + i * 10 + 5, 0)
+        assert allocator.getJob(10) == (i * 10, i * 10 + 5, 0)
+        assert allocator.getJob(10) == []
+
+
+def test_full_ring_raises():
+    allocator = RangeAllocator(2)
+    allocator.addRange(10, 20)
+    allocator.addRange(0, 5)
+    with pytest.raises(OverflowError):
+        allocator.addRange(30, 40)
+
+
+def test_adjacent_range_extends_the_front():
+    allocator = RangeAllocator(1)
+    allocator.addRange(50, 100)
+    allocator.addRange(0, 50)
+    assert len(allocator) == 1
+    assert allocator.getJob(1000) == (0, 100, 0)
+
+
+def test_planned_size_overrides_the_requested_size():
+    allocator = RangeAllocator(4)
+    allocator.addRange(0, 100, 30)
+    assert allocator.getJob(10) == (0, 30, 30)
+
+
+def test_avoid_skips_the_failed_endpoint():
+    allocator = RangeAllocator(4)
+    allocator.addRange(100, 200)
+    allocator.addRange(0, 50, 0, 1)
+    assert allocator.getJob(1000, 1, avoid=True) == (100, 200, 0)
+    assert allocator.getJob(1000, 2, avoid=True) == (0, 50, 0)
+
+
+def test_avoid_is_ignored_without_healthy_others():
+    allocator = RangeAllocator(4)
+    allocator.addRange(0, 50, 0, 1)
+    assert allocator.getJob(1000, 1, avoid=True) == []
+    assert allocator.getJob(1000, 1) == (0, 50, 0)
+
+
+def test_limit_holds_back_later_ranges():
+    allocator = RangeAllocator(4)
+    allocator.addRange(0, 100)
+    allocator.setLimit(40)
+    assert allocator.getJob(60) == (0, 40, 0)
+    assert allocator.getJob(60) == []
+    allocator.setLimit(-1)
+    assert allocator.getJob(60) == (40, 100, 0)
@@ -0,0 +1,140 @@
+import orjson
+import pytest
+from web3 import Web3
+from rawTransport import RawTransport, toRawFilter, unpackResponse
+
+ADDRESS = "0x78b3c724a2f663d11373c4a1978689271895256f"
+TOPIC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+LOG = {
+    "address": ADDRESS,
+    "topics": [TOPIC],
+    "data": "0x01",
+    "blockNumber": "0x10",
+    "logIndex": "0x2",
+    "transactionHash": "0xaa",
+    "blockHash": "0xbb",
+}
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.content = orjson.dumps(body)
+
+    def raise_for_status(self):
+        pass
+
+
+# answers each json-rpc request with reply(request), a reply of None leaves
+# that request out of the batch response
+class FakeSession:
+    def __init__(self, reply):
+        self.reply = reply
+        self.posted = []
+
+    def post(self, url, data, timeout):
+        payload = orjson.loads(data)
+        self.posted.append(payload)
+        if isinstance(payload, dict):
+            return FakeResponse(dict(self.reply(payload), id=payload["id"]))
+        body = []
+        for request in reversed(payload):
+            response = self.reply(request)
+            if response is not None:
+                body.append(dict(response, id=request["id"]))
+        return FakeResponse(body)
+
+
+def logsByBlock(request):
+    if request["method"] == "eth_blockNumber":
+        return {"result": "0x20"}
+    logFilter = request["params"][0]
+    if logFilter["fromBlock"] == "0x0":
+        return {
+            "error": {
+                "code": -32005,
+                "message": "query returned more than 10000 results",
+            }
+        }
+    return {"result": [LOG]}
+
+
+def newTransport(reply):
+    raw = RawTransport(Web3(Web3.HTTPProvider("http://localhost:8545")))
+    raw.session = FakeSession(reply)
+    return raw
+
+
+def test_filter_blocks_are_hex_and_empty_parts_dropped():
+    rawFilter = toRawFilter(
+        {"fromBlock": 16, "toBlock": "latest", "address": [], "topics": [[TOPIC]]}
+    )
+    assert rawFilter == {"fromBlock": "0x10", "toBlock": "latest", "topics": [[TOPIC]]}
+
+
+def test_error_response_raises_value_error():
+    error = {"code": -32000, "message": "header not found"}
+    with pytest.raises(ValueError) as info:
+        unpackResponse({"error": error})
+    assert info.value.args[0] == error
+    assert unpackResponse({"result": "0x1"}) == "0x1"
+
+
+def test_get_logs_normalizes_and_records_size():
+    raw = newTransport(logsByBlock)
+    logs = raw.getLogs({"fromBlock": 16, "toBlock": 16, "address": [ADDRESS]})
+    assert logs[0]["blockNumber"] == 16
+    assert logs[0]["logIndex"] == 2
+    assert logs[0]["address"] == Web3.to_checksum_address(ADDRESS)
+    assert raw.session.posted[0]["params"] == [
+        {"fromBlock": "0x10", "toBlock": "0x10", "address": [ADDRESS]}
+    ]
+    assert raw.lastBytes > 0
+
+
+def test_batch_keeps_request_order_and_failed_elements():
+    raw = newTransport(logsByBlock)
+    results, blockNumber = raw.getLogsBatch(
+        [
+            {"fromBlock": 16, "toBlock": 20},
+            {"fromBlock": 0, "toBlock": 15},
+            {"fromBlock": 21, "toBlock": 30},
+        ]
+    )
+    assert len(raw.session.posted) == 1
+    assert blockNumber == 32
+    assert results[0][0]["blockNumber"] == 16
+    assert isinstance(results[1], ValueError)
+    assert results[1].args[0]["code"] == -32005
+    assert results[2][0]["blockNumber"] == 16
+
+
+def test_batch_without_normalizing_returns_raw_logs():
+    raw = newTransport(logsByBlock)
+    results, blockNumber = raw.getLogsBatch(
+        [{"fromBlock": 16, "toBlock": 20}], normalize=False
+    )
+    assert results == [[LOG]]
+    assert blockNumber == 32
+
+
+def test_missing_batch_response_is_an_error_element():
+    def noBlockNumber(request):
+        if request["method"] == "eth_blockNumber":
+            return None
+        return logsByBlock(request)
+
+    results, blockNumber = newTransport(noBlockNumber).getLogsBatch(
+        [{"fromBlock": 16, "toBlock": 20}]
+    )
+    assert len(results[0]) == 1
+    assert isinstance(blockNumber, ValueError)
+
+
+def test_rejected_batch_raises():
+    raw = newTransport(logsByBlock)
+    error = {"code": -32600, "message": "batch too large"}
+    raw.session.post = lambda url, data, timeout: FakeResponse(
+        {"jsonrpc": "2.0", "id": None, "error": error}
+    )
+    with pytest.raises(ValueError):
+        raw.batch([("eth_blockNumber", [])])
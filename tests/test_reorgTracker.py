@@ -0,0 +1,60 @@
+from reorgTracker import ReorgTracker
+
+
+def chain(start, end, fork=""):
+    return [
+        (n, f"0x{fork}{n:02x}", f"0x{fork if n > start else ''}{n - 1:02x}")
+        for n in range(start, end)
+    ]
+
+
+def headerOf(headers):
+    byNumber = {header[0]: header for header in headers}
+    return lambda n: byNumber.get(n)
+
+
+def tracked(depth=64):
+    tracker = ReorgTracker(depth)
+    assert tracker.addHeaders(chain(1, 11), None) is None
+    return tracker
+
+
+def test_intact_chain():
+    tracker = tracked()
+    assert tracker.addHeaders(chain(11, 15), None) is None
+    assert tracker.head == 14
+
+
+def test_fork_is_found_at_the_common_ancestor():
+    tracker = tracked()
+    # blocks 8 to 10 were replaced, the new 11 builds on the new 10
+    canonical = chain(1, 8) + [
+        (n, f"0xff{n:02x}", f"0x{'ff' if n > 8 else ''}{n - 1:02x}")
+        for n in range(8, 12)
+    ]
+    fork = tracker.addHeaders(canonical[-1:], headerOf(canonical))
+    assert fork == 8
+    assert tracker.head == 7
+
+
+def test_missing_headers_count_as_mismatches():
+    tracker = tracked()
+    canonical = chain(1, 6)
+    fork = tracker.addHeaders([(11, "0xff0b", "0xff0a")], headerOf(canonical))
+    assert fork == 6
+
+
+def test_logs_from_another_fork():
+    tracker = tracked()
+    logs = [
+        {"blockNumber": 9, "blockHash": "0x09"},
+        {"blockNumber": 5, "blockHash": "0xAB"},
+        {"blockNumber": 7, "blockHash": "0xCD"},
+        {"blockNumber": 20, "blockHash": "0xEE"},
+    ]
+    assert tracker.checkLogs(logs) == 5
+
+
+def test_window_is_bounded():
+    tracker = tracked(depth=4)
+    assert list(tracker.hashes) == [7, 8, 9, 10]
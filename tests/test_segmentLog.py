@@ -0,0 +1,68 @@
+import json
+import os
+import zlib
+import pytest
+from configLoader import fileSettings
+from fileHandler import FileHandler, RECORDHEADER
+
+FIRST = {"5": {"0xtx": {"0xA": {"Sync 0": {"a": 1}}}}}
+SECOND = {"15": {"0xtx": {"0xA": {"Sync 2": {"b": 2}}}}}
+
+
+def toRecord(end, batch, removed=None):
+    body = [end, batch] if removed is None else [end, batch, removed]
+    record = json.dumps(body).encode()
+    return RECORDHEADER.pack(len(record), zlib.crc32(record)) + record
+
+
+@pytest.fixture
+def handler(tmp_path):
+    settings = dict(fileSettings, FILENAME="data", LATESTVIEW=False)
+    return FileHandler(settings, f"{tmp_path}/")
+
+
+def writeLog(handler, name, content):
+    with open(handler.filePath + name, "wb") as f:
+        f.write(content)
+
+
+def test_replays_every_record(handler):
+    writeLog(
+        handler,
+        "0.0.wal",
+        toRecord(10, FIRST) + toRecord(20, SECOND, ["5"]),
+    )
+    data = {}
+    assert handler.replayLog("0.0.wal", data, 0) == 20
+    assert data == SECOND
+
+
+def test_truncated_tail_is_discarded(handler):
+    second = toRecord(20, SECOND)
+    for cut in range(1, len(second)):
+        writeLog(handler, "0.0.wal", toRecord(10, FIRST) + second[:cut])
+        data = {}
+        assert handler.replayLog("0.0.wal", data, 0) == 10
+        assert data == FIRST
+
+
+def test_crc_failed_tail_is_discarded(handler):
+    second = bytearray(toRecord(20, SECOND))
+    second[-3] ^= 0xFF
+    writeLog(handler, "0.0.wal", toRecord(10, FIRST) + bytes(second))
+    data = {}
+    assert handler.replayLog("0.0.wal", data, 0) == 10
+    assert data == FIRST
+
+
+def test_recover_rewrites_the_segment(tmp_path, handler):
+    writeLog(
+        handler,
+        "0.0.wal",
+        toRecord(10, FIRST) + toRecord(20, SECOND)[:-1],
+    )
+    settings = dict(fileSettings, FILENAME="data", LATESTVIEW=False)
+    recovered = FileHandler(settings, f"{tmp_path}/")
+    assert recovered.getFiles() == [(0, 10)]
+    assert not os.path.exists(recovered.filePath + "0.0.wal")
+    assert recovered.loadFile("0.10.json") == FIRST
@@ -0,0 +1,55 @@
+import types
+import pytest
+import rateLimiter
+from rateLimiter import TokenBucket, RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rateLimiter, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_burst_is_available_at_once(clock):
+    bucket = TokenBucket(10, 20)
+    assert bucket.reserve(20) == 0
+    assert bucket.reserve(5) == pytest.approx(0.5)
+
+
+def test_refills_at_the_rate(clock):
+    bucket = TokenBucket(10)
+    assert bucket.reserve(10) == 0
+    clock[0] += 0.5
+    assert bucket.reserve(5) == 0
+    assert bucket.reserve(1) == pytest.approx(0.1)
+
+
+def test_refill_is_capped_at_the_burst(clock):
+    bucket = TokenBucket(10, 5)
+    clock[0] += 100
+    assert bucket.reserve(5) == 0
+    assert bucket.reserve(10) == pytest.approx(1.0)
+
+
+def test_back_off_slows_the_refill(clock):
+    bucket = TokenBucket(10)
+    bucket.backOff()
+    assert bucket.rate == pytest.approx(9)
+    # the remaining tokens and one second of refill are drained
+    assert bucket.reserve(9) == pytest.approx(2.0)
+
+
+def test_rate_recovers_after_a_back_off(clock):
+    bucket = TokenBucket(10)
+    bucket.backOff()
+    clock[0] += 100
+    for i in range(100):
+        bucket.reserve(0)
+    assert bucket.rate == 10
+
+
+def test_compute_units_are_charged_per_method(clock):
+    limiter = RateLimiter({"CUPS": 100})
+    assert limiter.reserve("eth_getLogs") == 0
+    assert limiter.reserve("eth_getLogs") == pytest.approx(0.5)